@@ -1,10 +1,13 @@
 import logging
 import tkinter as tk
 from tkinter import ttk
-from typing import List
+from typing import List, Union
 
 from polymetis import RobotInterface
 
+from data_management.base_data_manager import BaseDataManager
+from data_management.multi_robot_data_manager import MultiRobotDataManager
+from data_management.recording_process import RecordingProcess
 from data_management.robot_data_manager import RobotDataManager
 from GUI.status_log import StatusLog
 
@@ -18,7 +21,7 @@ class LoggingControl(tk.Frame):
         """
         super().__init__(master)
         self.logger = logging.getLogger(__name__)
-        self.data_managers:List[RobotDataManager] = []
+        self.data_managers:List[Union[BaseDataManager, RecordingProcess]] = []
         self.robot_interface_controls = robot_interface_controls
         self._init_ui()
 
@@ -36,24 +39,34 @@ class LoggingControl(tk.Frame):
         self.log_info_input = ttk.Entry(self, width=100, font=('Helvetica',12), style="Padded.TEntry")
         self.log_info_input.grid(row=2, column=0, columnspan=3, padx=5, pady=5)
 
+        # Time Alignment Option
+        self.time_aligned = tk.BooleanVar(value=False)
+        self.time_aligned_checkbutton = tk.Checkbutton(self, text="Record all robots time-aligned into one file", variable=self.time_aligned)
+        self.time_aligned_checkbutton.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky='w')
+
+        # Separate Process Option
+        self.separate_processes = tk.BooleanVar(value=False)
+        self.separate_processes_checkbutton = tk.Checkbutton(self, text="Record in separate processes", variable=self.separate_processes)
+        self.separate_processes_checkbutton.grid(row=3, column=2, padx=5, pady=5, sticky='w')
+
         # Start Button
         self.start_button = tk.Button(self, text="Start", command=self.start)
-        self.start_button.grid(row=3, column=0, padx=5, pady=5, sticky='ew')
+        self.start_button.grid(row=4, column=0, padx=5, pady=5, sticky='ew')
         self.start_button.config(state=tk.NORMAL)
 
         # Stop Button
         self.split_button = tk.Button(self, text="Split", command=self.split)
-        self.split_button.grid(row=3, column=1, padx=5, pady=5, sticky='ew')
+        self.split_button.grid(row=4, column=1, padx=5, pady=5, sticky='ew')
         self.split_button.config(state=tk.DISABLED)
 
         # Config Button
         self.stop_button = tk.Button(self, text="Stop", command=self.stop)
-        self.stop_button.grid(row=3, column=2, padx=5, pady=5, sticky='ew')
+        self.stop_button.grid(row=4, column=2, padx=5, pady=5, sticky='ew')
         self.stop_button.config(state=tk.DISABLED)
 
         #Status Log
         self.status_log = StatusLog(self, height=5, width=100)
-        self.status_log.grid(row=4, column=0, columnspan=3, sticky="nsew")
+        self.status_log.grid(row=5, column=0, columnspan=3, sticky="nsew")
         self.logger.addHandler(self.status_log.handler)
 
     def start(self):
@@ -64,7 +77,25 @@ class LoggingControl(tk.Frame):
             or any(robot is None for robot in robots)):
             self.logger.error("Robot interfaces not initialized.")
             return
-        if len(self.data_managers) == 0:
+        if len(self.data_managers) == 0 and self.separate_processes.get():
+            robot_addresses = [(ric.robot_cfg.server_ip, ric.robot_cfg.robot_port) for ric in self.robot_interface_controls]
+            if self.time_aligned.get():
+                self.data_managers.append(RecordingProcess(robot_addresses, 
+                                                           log_info=self.log_info_input.get(), 
+                                                           time_aligned=True,
+                                                           robot_names=[f"Robot {robot_cnt}" for robot_cnt in range(len(robots))]))
+            else:
+                for robot_cnt, robot_address in enumerate(robot_addresses):
+                    self.data_managers.append(RecordingProcess([robot_address], log_info=f"{self.log_info_input.get()} - Robot {robot_cnt}"))
+            for data_manager in self.data_managers:
+                data_manager.start()
+        elif len(self.data_managers) == 0 and self.time_aligned.get():
+            data_manager = MultiRobotDataManager(robots, 
+                                                 log_info=self.log_info_input.get(),
+                                                 robot_names=[f"Robot {robot_cnt}" for robot_cnt in range(len(robots))])
+            self.data_managers.append(data_manager)
+            data_manager.start()
+        elif len(self.data_managers) == 0:
             robot_cnt = 0
             for robot in robots:
                 data_manager = RobotDataManager(robot, log_info=f"{self.log_info_input.get()} - Robot {robot_cnt}")
@@ -72,6 +103,8 @@ class LoggingControl(tk.Frame):
                 self.data_managers.append(data_manager)
                 data_manager.start()
         self.start_button.config(state=tk.DISABLED)
+        self.time_aligned_checkbutton.config(state=tk.DISABLED)
+        self.separate_processes_checkbutton.config(state=tk.DISABLED)
         self.split_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.NORMAL)
         self.logger.info("Logging started.")
@@ -89,6 +122,8 @@ class LoggingControl(tk.Frame):
             data_manager.join()
         self.data_managers = []
         self.start_button.config(state=tk.NORMAL)
+        self.time_aligned_checkbutton.config(state=tk.NORMAL)
+        self.separate_processes_checkbutton.config(state=tk.NORMAL)
         self.split_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.DISABLED)
         self.logger.info("Logging stopped.")
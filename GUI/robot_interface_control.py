@@ -20,6 +20,10 @@ class RobotInterfaceControl(tk.Frame):
         self.robot_interface = None
         self._init_ui()
 
+    @property
+    def robot_cfg(self) -> DictConfig:
+        return self._robot_cfg
+
     def _init_ui(self):
         self.configure(highlightthickness=5, highlightbackground='black', padx=5, pady=5)
 
@@ -11,6 +11,7 @@ from tkinter import filedialog
 import tasks
 from tasks.base_tasks import BaseTask, ReplayBaseTask
 from data_management.base_data_manager import BaseDataManager
+from data_management.robot_log import ROBOT_LOG_EXTENSION
 from GUI.robot_interface_control import RobotInterfaceControl
 from GUI.status_log import StatusLog
 
@@ -71,10 +72,13 @@ class TaskControl(tk.Frame):
         if issubclass(task_type, ReplayBaseTask):
             demonstration_files = filedialog.askopenfilenames(
                 title="Select demonstration files",
-                filetypes=[("Pickle files", "*.pkl")],
+                filetypes=[("Demonstration files", f"*.pkl *{ROBOT_LOG_EXTENSION}"),
+                           ("Robot logs", f"*{ROBOT_LOG_EXTENSION}"),
+                           ("Pickle files", "*.pkl")],
                 initialdir=os.path.join(os.path.dirname(__file__), "../data_management/data")
             )
-            demonstrations = BaseDataManager.get_demonstrations_from_files(demonstration_files)
+            # decoded in the background, the task waits for the data instead of the GUI
+            demonstrations = BaseDataManager.load_demonstrations(demonstration_files, background=True)
             self._current_task = task_type(robots, demonstrations)
         else:
             self._current_task = task_type(robots)
@@ -0,0 +1,5 @@
+import os
+
+# pickled RobotClientMetadata of the robot simulated by the benchmarks
+DEFAULT_METADATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     "data_management", "robot_metadata.pkl")
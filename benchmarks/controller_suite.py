@@ -0,0 +1,224 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import polymetis_pb2
+import torch
+import torchcontrol as toco
+
+from benchmarks.constants import DEFAULT_METADATA_PATH
+from utils.latency_histogram import LatencyHistogram
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+NUM_DOF = 7
+# ticks before the measurement (the TorchScript profiling runs are slower)
+WARMUP_TICKS = 500
+
+def load_robot_model(metadata_path: str = DEFAULT_METADATA_PATH) -> toco.models.RobotModelPinocchio:
+    """Creates the robot model from pickled RobotClientMetadata like RobotInterface does."""
+    with open(metadata_path, "rb") as f:
+        metadata: polymetis_pb2.RobotClientMetadata = pickle.load(f)
+    with tempfile.NamedTemporaryFile("w+", suffix=".urdf") as urdf_file:
+        urdf_file.write(metadata.urdf)
+        urdf_file.flush()
+        return toco.models.RobotModelPinocchio(urdf_file.name, metadata.ee_link_name)
+
+def synthetic_states(num_states: int = 256, seed: int = 0) -> List[Dict[str, torch.Tensor]]:
+    """Random robot states with the fields the server passes to policies."""
+    generator = torch.Generator().manual_seed(seed)
+    return [{"joint_positions": torch.rand(NUM_DOF, generator=generator) - 0.5,
+             "joint_velocities": torch.randn(NUM_DOF, generator=generator),
+             "motor_torques_measured": torch.randn(NUM_DOF, generator=generator),
+             "motor_torques_external": torch.randn(NUM_DOF, generator=generator)} for _ in range(num_states)]
+
+def time_module(module: torch.jit.ScriptModule,
+                inputs: List[Any],
+                num_ticks: int = 5_000,
+                hz: float = 1000.0,
+                warmup_ticks: int = WARMUP_TICKS,
+                updates: Dict[int, Dict[str, torch.Tensor]] = None) -> LatencyHistogram:
+    """Measures the duration of module.forward, called once per tick like on the server.
+
+    Args:
+        module (torch.jit.ScriptModule): scripted policy or control module
+        inputs (List[Any]): inputs of forward, used in turn
+        num_ticks (int, optional): number of measured ticks. Defaults to 5_000.
+        hz (float, optional): tick frequency, 0 calls forward back to back. Defaults to 1000.0.
+        warmup_ticks (int, optional): ticks before the measurement. Defaults to WARMUP_TICKS.
+        updates (Dict[int, Dict[str, torch.Tensor]], optional): parameter updates of the policy applied before the tick
+                                                                 (not measured, like update_current_policy on the server). Defaults to None.
+
+    Returns:
+        LatencyHistogram: durations of the ticks
+    """
+    histogram = LatencyHistogram(min_us=1.0)
+    period = 1 / hz if hz > 0 else 0.0
+    updates = updates or dict()
+    next_tick = time.perf_counter()
+    for tick in range(warmup_ticks + num_ticks):
+        if tick in updates:
+            module.update(updates[tick])
+        if period > 0:
+            next_tick += period
+            while time.perf_counter() < next_tick:
+                pass
+        start = time.perf_counter()
+        module.forward(inputs[tick % len(inputs)])
+        if tick >= warmup_ticks:
+            histogram.add((time.perf_counter() - start) * 1e6)
+    return histogram
+
+def count_allocations(module: torch.jit.ScriptModule, inputs: List[Any], num_ticks: int = 200) -> Dict[str, float]:
+    """Counts the CPU allocations of module.forward with the torch profiler (run separately, the profiler slows down the ticks).
+
+    Returns:
+        Dict[str, float]: "allocs_per_step" (operators allocating memory) and "bytes_per_step"
+    """
+    for tick in range(20):
+        module.forward(inputs[tick % len(inputs)])
+    with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True) as profile:
+        for tick in range(num_ticks):
+            module.forward(inputs[tick % len(inputs)])
+    allocating = [event for event in profile.events() if event.self_cpu_memory_usage > 0]
+    return {"allocs_per_step": len(allocating) / num_ticks,
+            "bytes_per_step": sum(event.self_cpu_memory_usage for event in allocating) / num_ticks}
+
+def _torque_trajectory(num_knots: int) -> torch.Tensor:
+    times = torch.linspace(0, 1, num_knots)[:, None]
+    return torch.sin(2 * torch.pi * times * torch.arange(1, NUM_DOF + 1))
+
+def _streaming_updates(trajectory: torch.Tensor, chunk_size: int, hz: int = 1000) -> Dict[int, Dict[str, torch.Tensor]]:
+    # the chunk updates at the ticks the streaming task would send them
+    from controllers.streaming_torque_trajectory_executor import chunk_updates
+    return {math.ceil(update_time * hz): update for update_time, update in chunk_updates(trajectory, chunk_size, 1.0 / hz)}
+
+Case = Callable[[], Tuple[torch.nn.Module, List[Any], Dict[int, Dict[str, torch.Tensor]]]]
+
+def _cases(robot_model: toco.models.RobotModelPinocchio, num_ticks: int = 5_000) -> Dict[str, Case]:
+    # imported here, so the cases only require the modules they benchmark
+    from control_modules.kalman_filter import KalmanFilter
+    from controllers.force_feedback_controller import FEEDBACK_MODES, ForceFeedbackController
+    from controllers.human_controller import HumanController
+    from controllers.prodmp_torque_executor import ProDMPTorqueExecutor
+    from controllers.streaming_torque_trajectory_executor import StreamingTorqueTrajectoryExecutor
+    from controllers.torque_trajectory_executor import TorqueTrajectoryExecutor
+
+    states = synthetic_states()
+    # the trajectories cover all ticks, so no tick runs after the termination
+    trajectory = _torque_trajectory(max(60_000, WARMUP_TICKS + num_ticks + 1))
+    cases = {"HumanController": lambda: (HumanController(robot_model), states, None)}
+    for mode in FEEDBACK_MODES:
+        cases[f"ForceFeedbackController[{mode}]"] = \
+            lambda mode=mode: (ForceFeedbackController(robot_model, initial_replication_torques=torch.randn(NUM_DOF),
+                                                       feedback_mode=mode), states, None)
+    cases["TorqueTrajectoryExecutor"] = lambda: (TorqueTrajectoryExecutor(trajectory), states, None)
+    for interpolation in ["linear", "cubic"]:
+        cases[f"TorqueTrajectoryExecutor[{interpolation}, 250 Hz]"] = \
+            lambda interpolation=interpolation: (TorqueTrajectoryExecutor(trajectory[::4], times=torch.arange(len(trajectory[::4])) * 0.004,
+                                                                          interpolation=interpolation), states, None)
+    # small chunks, so the measured ticks include several buffer switches
+    streamed = trajectory[:WARMUP_TICKS + num_ticks + 1]
+    cases["StreamingTorqueTrajectoryExecutor"] = \
+        lambda: (StreamingTorqueTrajectoryExecutor(streamed, chunk_size=250), states, _streaming_updates(streamed, 250))
+    cases["ProDMPTorqueExecutor"] = \
+        lambda: (ProDMPTorqueExecutor(torch.linspace(0, 60, 200), torch.rand(200, 11), torch.randn(200, NUM_DOF),
+                                      torch.randn(NUM_DOF, 10), torch.randn(NUM_DOF)), states, None)
+    observations = [state["motor_torques_external"] for state in states]
+    cases["KalmanFilter"] = lambda: (KalmanFilter(torch.zeros(NUM_DOF)), observations, None)
+    for variant, kwargs in [("steady_state", {"steady_state": True}),
+                            ("decoupled", {"decoupled": True}),
+                            ("decoupled, steady_state", {"decoupled": True, "steady_state": True})]:
+        cases[f"KalmanFilter[{variant}]"] = lambda kwargs=kwargs: (KalmanFilter(torch.zeros(NUM_DOF), **kwargs), observations, None)
+    return cases
+
+def git_commit() -> str:
+    """Returns the short hash of HEAD ("+dirty" if there are uncommitted changes) or "unknown" outside of git."""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+dirty" if dirty else "")
+
+def run(case_filter: str = None,
+        num_ticks: int = 5_000,
+        hz: float = 1000.0,
+        metadata_path: str = DEFAULT_METADATA_PATH) -> Dict[str, Dict[str, float]]:
+    """Scripts each controller of the repository and measures its step latency and allocations.
+
+    Args:
+        case_filter (str, optional): only run cases containing this string. Defaults to None (all cases).
+        num_ticks (int, optional): measured ticks per case. Defaults to 5_000.
+        hz (float, optional): tick frequency, 0 runs the ticks back to back. Defaults to 1000.0.
+        metadata_path (str, optional): pickled RobotClientMetadata for the robot model. Defaults to DEFAULT_METADATA_PATH.
+
+    Returns:
+        Dict[str, Dict[str, float]]: latency summary (see LatencyHistogram.summary) and allocations of each case
+    """
+    results = {}
+    for name, case in _cases(load_robot_model(metadata_path), num_ticks).items():
+        if case_filter is not None and case_filter not in name:
+            continue
+        module, inputs, updates = case()
+        latency = time_module(torch.jit.script(module), inputs, num_ticks, hz, updates=updates)
+        # a fresh module, so the allocations are not counted at the end of a trajectory
+        module, inputs, _ = case()
+        results[name] = {**latency.summary(), **count_allocations(torch.jit.script(module), inputs)}
+    return results
+
+def save_results(results: Dict[str, Dict[str, float]], settings: Dict, results_dir: str = RESULTS_DIR) -> str:
+    """Saves the results as <results_dir>/<commit>.json and returns the path."""
+    commit = git_commit()
+    os.makedirs(results_dir, exist_ok=True)
+    file_path = os.path.join(results_dir, f"{commit}.json")
+    with open(file_path, "w") as f:
+        json.dump({"commit": commit,
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "platform": platform.platform(),
+                   "torch": torch.__version__,
+                   "settings": settings,
+                   "results": results}, f, indent=2)
+    return file_path
+
+def load_results(commit: str, results_dir: str = RESULTS_DIR) -> Dict[str, Dict[str, float]]:
+    with open(os.path.join(results_dir, f"{commit}.json")) as f:
+        return json.load(f)["results"]
+
+def format_results(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]] = None) -> str:
+    lines = [f"{'case':<45}{'p50 µs':>10}{'p99 µs':>10}{'max µs':>10}{'allocs':>9}{'bytes':>9}"]
+    for name, result in results.items():
+        line = (f"{name:<45}{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}{result['max_us']:>10.1f}"
+                f"{result['allocs_per_step']:>9.1f}{result['bytes_per_step']:>9.0f}")
+        if baseline is not None and name in baseline:
+            line += f"   p50 {result['p50_us'] / baseline[name]['p50_us'] - 1:+.0%}, p99 {result['p99_us'] / baseline[name]['p99_us'] - 1:+.0%}"
+        lines.append(line)
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per tick cost of the scripted controllers and control modules.")
+    parser.add_argument("--filter", default=None, help="only run cases containing this string")
+    parser.add_argument("--ticks", type=int, default=5_000)
+    parser.add_argument("--hz", type=float, default=1000.0, help="tick frequency, 0 for back to back ticks")
+    parser.add_argument("--metadata", default=DEFAULT_METADATA_PATH, help="pickled RobotClientMetadata")
+    parser.add_argument("--compare", default=None, help="commit of earlier results to compare with")
+    parser.add_argument("--no-save", action="store_true", help="do not save the results")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.ticks, args.hz, args.metadata)
+    baseline = load_results(args.compare) if args.compare else None
+    print(format_results(results, baseline))
+    if not args.no_save:
+        print(f"Results saved to {save_results(results, {'ticks': args.ticks, 'hz': args.hz})}")
+
+if __name__ == "__main__":
+    main()
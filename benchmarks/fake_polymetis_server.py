@@ -0,0 +1,236 @@
+import argparse
+from concurrent import futures
+import io
+import logging
+import pickle
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import grpc
+import numpy as np
+import polymetis_pb2
+import polymetis_pb2_grpc
+import torch
+
+from benchmarks.constants import DEFAULT_METADATA_PATH
+from data_management.demonstration import Demonstration
+from data_management.robot_log import JOINT_FIELDS
+
+class FakePolymetisServer(polymetis_pb2_grpc.PolymetisControllerServerServicer):
+    def __init__(self,
+                 demonstrations: List[Demonstration] = None,
+                 metadata_path: str = DEFAULT_METADATA_PATH,
+                 hz: int = None,
+                 speed: float = 1.0,
+                 log_size: int = 300_000):
+        """Stand-in for a Polymetis controller server without robot hardware.
+
+            The robot states are replayed from recorded demonstrations (in a loop), or the rest pose
+            of the robot is held if there are none. Policies sent by a RobotInterface are executed
+            on every replayed state like on the real server: their torques are reported as joint_torques_computed,
+            parameter updates are applied and terminated policies end their episode,
+            so blocking calls like move_to_joint_positions return.
+            Timestamps advance by 1/hz per state, independent of the replay speed.
+
+        Args:
+            demonstrations (List[Demonstration], optional): demonstrations to replay. Defaults to None.
+            metadata_path (str, optional): pickled RobotClientMetadata of the simulated robot. Defaults to DEFAULT_METADATA_PATH.
+            hz (int, optional): control frequency. Defaults to None (frequency of the metadata).
+            speed (float, optional): replay speed relative to real time, 0 replays as fast as possible. Defaults to 1.0.
+            log_size (int, optional): number of states kept for GetRobotStateLog. Defaults to 300_000.
+        """
+        self.logger = logging.getLogger(__name__)
+        with open(metadata_path, "rb") as f:
+            self.metadata: polymetis_pb2.RobotClientMetadata = pickle.load(f)
+        self.hz = hz or self.metadata.hz
+        self.speed = speed
+        self._columns = [{name: demonstration.field(name).numpy() for name in JOINT_FIELDS}
+                         for demonstration in demonstrations or [] if len(demonstration) > 0]
+        if len(self._columns) == 0:
+            rest_pose = np.array(self.metadata.rest_pose, dtype=np.float32)
+            self._columns = [{name: (rest_pose if name == "joint_positions" else np.zeros_like(rest_pose))[None]
+                              for name in JOINT_FIELDS}]
+        self._demonstration_idx = 0
+        self._sample_idx = 0
+
+        self._log: List[polymetis_pb2.RobotState] = [None] * log_size
+        self._num_states = 0
+        self._new_state = threading.Condition()
+        self._policy: torch.jit.ScriptModule = None
+        self._policy_lock = threading.Lock()
+        self._episode_start = -1
+        self._episode_end = -1
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.overruns = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._new_state:
+            self._new_state.notify_all()
+        self._thread.join()
+
+    def _next_sample(self) -> Dict[str, np.ndarray]:
+        columns = self._columns[self._demonstration_idx]
+        sample = {name: values[self._sample_idx] for name, values in columns.items()}
+        self._sample_idx += 1
+        if self._sample_idx >= len(columns["joint_positions"]):
+            self._sample_idx = 0
+            self._demonstration_idx = (self._demonstration_idx + 1) % len(self._columns)
+        return sample
+
+    def _step(self, timestamp_ns: int) -> polymetis_pb2.RobotState:
+        sample = self._next_sample()
+        robot_state = polymetis_pb2.RobotState()
+        robot_state.timestamp.seconds, robot_state.timestamp.nanos = divmod(timestamp_ns, 1_000_000_000)
+        with self._policy_lock:
+            if self._policy is not None:
+                state_dict = {name: torch.from_numpy(sample[name]) for name in
+                              ["joint_positions", "joint_velocities", "motor_torques_measured", "motor_torques_external"]}
+                start = time.perf_counter()
+                torques = self._policy.forward(state_dict)["joint_torques"].detach().numpy()
+                robot_state.prev_controller_latency_ms = (time.perf_counter() - start) * 1000
+                sample = {**sample, "joint_torques_computed": torques, "motor_torques_desired": torques}
+                if self._policy.is_terminated():
+                    self._end_episode()
+        for name in JOINT_FIELDS:
+            getattr(robot_state, name).extend(sample[name].tolist())
+        robot_state.prev_command_successful = True
+        return robot_state
+
+    def _run(self):
+        period = 1 / (self.hz * self.speed) if self.speed > 0 else 0.0
+        period_ns = 1_000_000_000 // self.hz
+        start_time_ns = time.time_ns()
+        start_time = time.perf_counter()
+        tick = 0
+        while not self._stop_event.is_set():
+            robot_state = self._step(start_time_ns + tick * period_ns)
+            with self._new_state:
+                self._log[self._num_states % len(self._log)] = robot_state
+                self._num_states += 1
+                self._new_state.notify_all()
+            tick += 1
+            if period > 0:
+                remaining = start_time + tick * period - time.perf_counter()
+                if remaining > 0:
+                    time.sleep(remaining)
+                elif remaining < -period:
+                    self.overruns += 1
+
+    def _end_episode(self):
+        # called with the policy lock
+        self._policy = None
+        self._episode_end = self._num_states + 1
+
+    def _log_interval(self) -> polymetis_pb2.LogInterval:
+        return polymetis_pb2.LogInterval(start=self._episode_start, end=self._episode_end)
+
+    @staticmethod
+    def _load_module(request_iterator) -> torch.jit.ScriptModule:
+        buffer = io.BytesIO(b"".join(chunk.torchscript_binary_chunk for chunk in request_iterator))
+        return torch.jit.load(buffer)
+
+    def GetRobotClientMetadata(self, request, context):
+        return self.metadata
+
+    def GetRobotState(self, request, context):
+        with self._new_state:
+            self._new_state.wait_for(lambda: self._num_states > 0 or self._stop_event.is_set())
+            return self._log[(self._num_states - 1) % len(self._log)]
+
+    def GetRobotStateStream(self, request, context):
+        with self._new_state:
+            next_state = self._num_states
+        while context.is_active() and not self._stop_event.is_set():
+            with self._new_state:
+                self._new_state.wait_for(lambda: self._num_states > next_state or self._stop_event.is_set(), timeout=0.1)
+                # slow clients get the states they missed as long as they are in the log
+                next_state = max(next_state, self._num_states - len(self._log))
+                robot_states = [self._log[idx % len(self._log)] for idx in range(next_state, self._num_states)]
+                next_state = self._num_states
+            yield from robot_states
+
+    def GetRobotStateLog(self, request, context):
+        with self._new_state:
+            end = self._num_states if request.end < 0 else min(request.end, self._num_states)
+            start = max(request.start, end - len(self._log), 0)
+            robot_states = [self._log[idx % len(self._log)] for idx in range(start, end)]
+        yield from robot_states
+
+    def SetController(self, request_iterator, context):
+        policy = self._load_module(request_iterator)
+        with self._policy_lock:
+            self._policy = policy
+            self._episode_start = self._num_states
+            self._episode_end = -1
+            return self._log_interval()
+
+    def UpdateController(self, request_iterator, context):
+        updater = self._load_module(request_iterator)
+        with self._policy_lock:
+            if self._policy is None:
+                context.abort(grpc.StatusCode.FAILED_PRECONDITION, "No policy running.")
+            self._policy.update(updater())
+            return polymetis_pb2.LogInterval(start=self._num_states, end=-1)
+
+    def TerminateController(self, request, context):
+        with self._policy_lock:
+            if self._policy is None:
+                context.abort(grpc.StatusCode.FAILED_PRECONDITION, "No policy running.")
+            self._end_episode()
+            return self._log_interval()
+
+    def GetEpisodeInterval(self, request, context):
+        with self._policy_lock:
+            return self._log_interval()
+
+def serve(demonstrations: List[Demonstration] = None,
+          port: int = 50051,
+          max_workers: int = 16,
+          **server_kwargs) -> Tuple[grpc.Server, FakePolymetisServer]:
+    """Starts a fake Polymetis server on localhost.
+
+    Args:
+        demonstrations (List[Demonstration], optional): demonstrations to replay. Defaults to None.
+        port (int, optional): port of the gRPC server. Defaults to 50051.
+        max_workers (int, optional): maximum number of concurrent requests (every state stream occupies one). Defaults to 16.
+        **server_kwargs: further arguments of FakePolymetisServer (e.g. speed)
+
+    Returns:
+        Tuple[grpc.Server, FakePolymetisServer]: running gRPC server and servicer, stop both when done
+    """
+    servicer = FakePolymetisServer(demonstrations, **server_kwargs)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    polymetis_pb2_grpc.add_PolymetisControllerServerServicer_to_server(servicer, server)
+    server.add_insecure_port(f"[::]:{port}")
+    servicer.start()
+    server.start()
+    return server, servicer
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Polymetis server replaying recorded demonstrations.")
+    parser.add_argument("demonstrations", nargs="*", help="demonstration files (*.famlog or *.pkl) to replay")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed relative to real time, 0 for as fast as possible")
+    parser.add_argument("--hz", type=int, default=None, help="control frequency, defaults to the frequency of the robot metadata")
+    parser.add_argument("--metadata", default=DEFAULT_METADATA_PATH, help="pickled RobotClientMetadata")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    demonstrations = [Demonstration(file_path) for file_path in args.demonstrations]
+    server, servicer = serve(demonstrations, port=args.port, speed=args.speed, hz=args.hz, metadata_path=args.metadata)
+    servicer.logger.info(f"Fake Polymetis server listening on port {args.port}.")
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        pass
+    server.stop(grace=1.0)
+    servicer.stop()
+
+if __name__ == "__main__":
+    main()
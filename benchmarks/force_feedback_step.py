@@ -0,0 +1,36 @@
+import argparse
+from typing import Dict, List
+
+import torch
+
+from benchmarks.controller_suite import load_robot_model, synthetic_states, time_module
+from benchmarks.constants import DEFAULT_METADATA_PATH
+from controllers.force_feedback_controller import FEEDBACK_MODES, ForceFeedbackController
+
+def run(modes: List[str] = FEEDBACK_MODES, num_ticks: int = 10_000, metadata_path: str = DEFAULT_METADATA_PATH) -> Dict[str, Dict[str, float]]:
+    """Measures the tick duration of ForceFeedbackController for each feedback mode (back to back ticks).
+
+    Returns:
+        Dict[str, Dict[str, float]]: LatencyHistogram.summary of each mode
+    """
+    robot_model = load_robot_model(metadata_path)
+    states = synthetic_states()
+    results = {}
+    for mode in modes:
+        policy = torch.jit.script(ForceFeedbackController(robot_model, feedback_mode=mode))
+        policy.replication_torques.data.copy_(torch.randn(policy.replication_torques.shape))
+        results[mode] = time_module(policy, states, num_ticks, hz=0).summary()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per tick cost of the force feedback modes of ForceFeedbackController.")
+    parser.add_argument("--modes", nargs="+", default=FEEDBACK_MODES, choices=FEEDBACK_MODES)
+    parser.add_argument("--ticks", type=int, default=10_000)
+    parser.add_argument("--metadata", default=DEFAULT_METADATA_PATH, help="pickled RobotClientMetadata")
+    args = parser.parse_args()
+
+    for mode, summary in run(args.modes, args.ticks, args.metadata).items():
+        print(f"{mode:>10}: " + ", ".join(f"{name} {value:.1f}" for name, value in summary.items()))
+
+if __name__ == "__main__":
+    main()
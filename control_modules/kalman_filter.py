@@ -1,29 +1,185 @@
+from typing import Dict, List, Tuple
+
 import torch
 import torchcontrol as toco
 
+def steady_state_gain(dt: float, x_cov: float, dx_cov: float, obs_noise_cov: float,
+                      tol: float = 1e-12, max_iterations: int = 1_000_000) -> Tuple[float, float]:
+    """Converged Kalman gain of a 2-state (position, velocity) filter observing the position.
+
+        The Riccati recursion is iterated from the initial covariance of KalmanFilter (diag(x_cov, dx_cov))
+        until the gain does not change anymore. Without velocity noise the velocity gain only converges slowly towards 0.
+
+    Args:
+        dt (float): time step
+        x_cov (float): covariance of position noise
+        dx_cov (float): covariance of velocity noise
+        obs_noise_cov (float): covariance of observation noise
+        tol (float, optional): maximum change of the gain at convergence. Defaults to 1e-12.
+        max_iterations (int, optional): maximum number of iterations. Defaults to 1_000_000.
+
+    Returns:
+        Tuple[float, float]: gain of position and velocity
+    """
+    p11, p12, p22 = x_cov, 0.0, dx_cov
+    k1, k2 = 0.0, 0.0
+    for _ in range(max_iterations):
+        # predict
+        p11 = p11 + 2 * dt * p12 + dt * dt * p22 + x_cov
+        p12 = p12 + dt * p22
+        p22 = p22 + dx_cov
+        # update
+        s = p11 + obs_noise_cov
+        k1_new, k2_new = p11 / s, p12 / s
+        p22 = p22 - k2_new * p12
+        p11 = (1 - k1_new) * p11
+        p12 = (1 - k1_new) * p12
+        converged = abs(k1_new - k1) < tol and abs(k2_new - k2) < tol
+        k1, k2 = k1_new, k2_new
+        if converged:
+            break
+    return k1, k2
+
+def rts_smooth(observations: torch.Tensor,
+               lengths: torch.Tensor = None,
+               dt: float = 0.001,
+               x_cov: float = 1.0e-7,
+               dx_cov: float = 0.0,
+               obs_noise_cov: float = 1.2e-03,
+               initial_positions: torch.Tensor = None) -> Dict[str, torch.Tensor]:
+    """Kalman filtering and Rauch-Tung-Striebel smoothing of a batch of recordings (same model as KalmanFilter).
+
+        The model is decoupled per joint, so every time step is a few elementwise operations on the whole batch
+        and the cost grows with the length of the longest recording, not with the number of recordings.
+        The filtered positions are the outputs of KalmanFilter(initial_positions) stepping through the observations.
+        Samples after the length of a recording are treated as missing observations, so they do not affect the result.
+
+    Args:
+        observations (torch.Tensor): observed positions with shape [batch, time, dof] (padded to the longest recording)
+        lengths (torch.Tensor, optional): number of valid samples of each recording with shape [batch]. Defaults to None (all valid).
+        dt (float, optional): time step. Defaults to 0.001.
+        x_cov (float, optional): convariance of poisition noise. Defaults to 1.0e-7.
+        dx_cov (float, optional): covariance of velocity noise. Defaults to 0.0.
+        obs_noise_cov (float, optional): covariance of observation noise. Defaults to 1.2e-03.
+        initial_positions (torch.Tensor, optional): initial state with shape [batch, dof]. Defaults to None (first observations).
+
+    Returns:
+        Dict[str, torch.Tensor]: "filtered" positions, "smoothed" positions and "smoothed_velocities" with shape [batch, time, dof]
+    """
+    batch_size, num_times, _ = observations.shape
+    valid = torch.ones(batch_size, num_times, dtype=torch.bool) if lengths is None else \
+        torch.arange(num_times)[None, :] < torch.as_tensor(lengths)[:, None]
+
+    # the covariances do not depend on the observations, only on which are missing ([batch, 1], shared by the joints)
+    P11 = torch.full((batch_size, 1), x_cov, dtype=torch.float64)
+    P12 = torch.zeros(batch_size, 1, dtype=torch.float64)
+    P22 = torch.full((batch_size, 1), dx_cov, dtype=torch.float64)
+    P_pred = torch.empty(3, num_times, batch_size, 1, dtype=torch.float64)
+    P_filt = torch.empty(3, num_times, batch_size, 1, dtype=torch.float64)
+
+    # forward pass (filter)
+    pos = (observations[:, 0] if initial_positions is None else initial_positions).to(observations.dtype).clone()
+    vel = torch.zeros_like(pos)
+    filtered_pos = torch.empty_like(observations)
+    filtered_vel = torch.empty_like(observations)
+    for t in range(num_times):
+        # predict
+        pos = pos + dt * vel
+        P11 = P11 + 2 * dt * P12 + dt * dt * P22 + x_cov
+        P12 = P12 + dt * P22
+        P22 = P22 + dx_cov
+        P_pred[0, t], P_pred[1, t], P_pred[2, t] = P11, P12, P22
+        # update (no update without observation)
+        observed = valid[:, t, None]
+        S = P11 + obs_noise_cov
+        k1 = torch.where(observed, P11 / S, torch.zeros_like(S))
+        k2 = torch.where(observed, P12 / S, torch.zeros_like(S))
+        innovation = observations[:, t] - pos
+        pos = pos + k1.to(pos.dtype) * innovation
+        vel = vel + k2.to(vel.dtype) * innovation
+        P22 = P22 - k2 * P12
+        P11 = (1 - k1) * P11
+        P12 = (1 - k1) * P12
+        P_filt[0, t], P_filt[1, t], P_filt[2, t] = P11, P12, P22
+        filtered_pos[:, t] = pos
+        filtered_vel[:, t] = vel
+
+    # smoother gains C = P_filt(t) F^T P_pred(t + 1)^-1 of all time steps at once
+    a, b, c = P_filt[:, :-1]
+    p, q, r = P_pred[:, 1:]
+    det = p * r - q * q
+    regular = det > 1e-300
+    safe_det = torch.where(regular, det, torch.ones_like(det))
+    # without velocity uncertainty P_pred is singular, its pseudo inverse only inverts the position part
+    inv11 = torch.where(regular, r / safe_det, 1 / p)
+    inv12 = torch.where(regular, -q / safe_det, torch.zeros_like(q))
+    inv22 = torch.where(regular, p / safe_det, torch.zeros_like(p))
+    C11 = ((a + dt * b) * inv11 + b * inv12).to(observations.dtype)
+    C12 = ((a + dt * b) * inv12 + b * inv22).to(observations.dtype)
+    C21 = ((b + dt * c) * inv11 + c * inv12).to(observations.dtype)
+    C22 = ((b + dt * c) * inv12 + c * inv22).to(observations.dtype)
+
+    # backward pass (smoother)
+    smoothed_pos = torch.empty_like(observations)
+    smoothed_vel = torch.empty_like(observations)
+    pos, vel = filtered_pos[:, -1], filtered_vel[:, -1]
+    smoothed_pos[:, -1], smoothed_vel[:, -1] = pos, vel
+    for t in range(num_times - 2, -1, -1):
+        pos_error = pos - (filtered_pos[:, t] + dt * filtered_vel[:, t])
+        vel_error = vel - filtered_vel[:, t]
+        pos = filtered_pos[:, t] + C11[t] * pos_error + C12[t] * vel_error
+        vel = filtered_vel[:, t] + C21[t] * pos_error + C22[t] * vel_error
+        smoothed_pos[:, t], smoothed_vel[:, t] = pos, vel
+    return {"filtered": filtered_pos, "smoothed": smoothed_pos, "smoothed_velocities": smoothed_vel}
+
+def smooth_recordings(recordings: List[torch.Tensor], **kwargs) -> List[torch.Tensor]:
+    """Smooths recordings of different lengths in one batch (see rts_smooth).
+
+    Args:
+        recordings (List[torch.Tensor]): observed positions of each recording with shape [time_i, dof]
+        **kwargs: model parameters of rts_smooth
+
+    Returns:
+        List[torch.Tensor]: smoothed positions of each recording
+    """
+    lengths = torch.tensor([len(recording) for recording in recordings])
+    observations = torch.nn.utils.rnn.pad_sequence(recordings, batch_first=True)
+    smoothed = rts_smooth(observations, lengths, **kwargs)["smoothed"]
+    return [smoothed[idx, :length] for idx, length in enumerate(lengths.tolist())]
+
 class KalmanFilter(toco.ControlModule):
     def __init__(self, 
                  X : torch.Tensor, 
                  dt : float = 0.001, 
                  x_cov : float = 1.0e-7, 
                  dx_cov : float = 0.0, 
-                 obs_noise_cov : float = 1.2e-03):
+                 obs_noise_cov : float = 1.2e-03,
+                 steady_state : bool = False,
+                 decoupled : bool = False):
         """Kalman Filter for linear dynamic system
 
+            Every joint is modelled independently (constant velocity, position observed),
+            so all matrices are block diagonal per joint. This allows two cheaper variants with the same model:
+            steady_state uses the converged gain instead of propagating the covariance (no matrix inversion per step),
+            decoupled runs one 2-state filter per joint as elementwise vector operations.
+            Both can be combined.
+
         Args:
             X (torch.Tensor): initial state vector
             dt (float, optional): time step. Defaults to 0.001.
             x_cov (float, optional): convariance of poisition noise. Defaults to 1.0e-7.
             dx_cov (float, optional): covariance of velocity noise. Defaults to 0.0.
             obs_noise_cov (float, optional): covariance of observation noise. Defaults to 1.2e-03.
+            steady_state (bool, optional): use the precomputed steady-state gain (see steady_state_gain). Defaults to False.
+            decoupled (bool, optional): filter the joints with elementwise operations. Defaults to False.
         """
         super().__init__()
 
         # Time interval
         self.size = X.size(dim=0)
-
-        # State vector
-        self.X = torch.nn.Parameter(torch.cat((X,torch.zeros((self.size)))))
+        self.dt = dt
+        self.steady_state = steady_state
+        self.decoupled = decoupled
 
         # State vector
         self.X = torch.nn.Parameter(torch.cat((X, torch.zeros((self.size,))), dim=0))
@@ -48,7 +204,57 @@ class KalmanFilter(toco.ControlModule):
         self.S = torch.nn.Parameter(torch.zeros((self.size, self.size)))
         self.K = self.X
 
+        # Per joint state and covariance (P11, P12, P22) of the decoupled filter
+        self.pos = X.clone()
+        self.vel = torch.zeros(self.size)
+        self.x_cov = x_cov
+        self.dx_cov = dx_cov
+        self.obs_noise_cov = obs_noise_cov
+        self.P11 = torch.full((self.size,), x_cov)
+        self.P12 = torch.zeros(self.size)
+        self.P22 = torch.full((self.size,), dx_cov)
+
+        # Steady-state gain: X = A X + K Z with A = (I - K H) F
+        k1, k2 = steady_state_gain(dt, x_cov, dx_cov, obs_noise_cov) if steady_state else (0.0, 0.0)
+        self.k1 = k1
+        self.k2 = k2
+        if steady_state:
+            self.K = torch.nn.Parameter(torch.cat((torch.diag(torch.full((self.size,), k1)),
+                                                   torch.diag(torch.full((self.size,), k2))), dim=0))
+            self.A = torch.matmul(torch.eye(2 * self.size) - torch.matmul(self.K.data, self.H.data), self.F.data)
+        else:
+            self.A = self.F.data.clone()
+
+    def _forward_decoupled(self, Z: torch.Tensor) -> torch.Tensor:
+        # predict
+        self.pos = self.pos + self.dt * self.vel
+        if not self.steady_state:
+            self.P11 = self.P11 + 2 * self.dt * self.P12 + self.dt * self.dt * self.P22 + self.x_cov
+            self.P12 = self.P12 + self.dt * self.P22
+            self.P22 = self.P22 + self.dx_cov
+        # update
+        innovation = Z - self.pos
+        if self.steady_state:
+            self.pos = self.pos + self.k1 * innovation
+            self.vel = self.vel + self.k2 * innovation
+        else:
+            S = self.P11 + self.obs_noise_cov
+            k1 = self.P11 / S
+            k2 = self.P12 / S
+            self.pos = self.pos + k1 * innovation
+            self.vel = self.vel + k2 * innovation
+            self.P22 = self.P22 - k2 * self.P12
+            self.P11 = (1 - k1) * self.P11
+            self.P12 = (1 - k1) * self.P12
+        return self.pos
+
     def forward(self, Z: torch.Tensor):
+        if self.decoupled:
+            return self._forward_decoupled(Z)
+        if self.steady_state:
+            self.X = torch.matmul(self.A, self.X) + torch.matmul(self.K, Z)
+            return self.X[:self.size]
+
         self.X = torch.matmul(self.F, self.X)
         self.P = torch.matmul(torch.matmul(self.F, self.P), torch.transpose(self.F, 0, 1)) + self.Q
 
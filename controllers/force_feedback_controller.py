@@ -2,10 +2,12 @@ from typing import Dict
 
 import torch
 import torchcontrol as toco
-import numpy as np
 
 from controllers.human_controller import HumanController
 
+# laws for blending the replication torques into the torques of the demonstrator
+FEEDBACK_MODES = ["clamp", "scaled", "passivity"]
+
 class ForceFeedbackController(HumanController):
     def __init__(self, 
                  robot_model: toco.models.RobotModelPinocchio, 
@@ -13,7 +15,9 @@ class ForceFeedbackController(HumanController):
                  centering_gain:torch.Tensor = torch.Tensor([5.0, 2.2, 1.3, 0.3, 0.1, 0.1, 0.0]),
                  initial_replication_torques: torch.Tensor = torch.Tensor([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]), 
                  force_feedback_damping_gain: torch.Tensor = torch.Tensor([25.0, 25.0, 25.0, 25.0, 7.5, 4.0, 4.0]),
-                 force_feedback:bool = True):
+                 force_feedback:bool = True,
+                 feedback_mode: str = "clamp",
+                 feedback_scale: float = 1.0):
         """HumanController with capability to give force feedback to the user
         To reproduce a torque the torque has to be transmitted to this controller via the update_parameter({"replication_torque": <torques_to_be_reproduced>}) function
 
@@ -24,11 +28,30 @@ class ForceFeedbackController(HumanController):
             initial_replication_torques (torch.Tensor, optional): initialize the force feedback. Defaults to torch.Tensor([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]).
             force_feedback_damping_gain (torch.Tensor, optional): gain for damping the force feedback depending on the current velocity. Defaults to torch.Tensor([25.0, 25.0, 25.0, 25.0, 7.5, 4.0, 4.0]).
             force_feedback (bool, optional): enables/disables force feedback. Defaults to True.
+            feedback_mode (str, optional): blending of the replication torques. Defaults to "clamp".
+                "clamp": only replication torques opposing the demonstrator are fed back, limited to the torque of the demonstrator
+                "scaled": the replication torques are passed through, scaled by feedback_scale
+                "passivity": the replication torques damped by force_feedback_damping_gain,
+                             limited so they never do positive work on the joints
+            feedback_scale (float, optional): scale of the "scaled" mode. Defaults to 1.0.
         """
         super().__init__(robot_model, assistive_gain, centering_gain)
+        if feedback_mode not in FEEDBACK_MODES:
+            raise ValueError(f"Unknown feedback mode {feedback_mode}, expected one of {FEEDBACK_MODES}.")
         self.replication_torques = torch.nn.Parameter(initial_replication_torques)
         self._force_feedback_damping_gain = force_feedback_damping_gain
         self._force_feedback = force_feedback
+        self._feedback_mode = FEEDBACK_MODES.index(feedback_mode)
+        self._feedback_scale = feedback_scale
+
+    def _get_clamped_feedback(self, demonstrator_torques: torch.Tensor, feedback_torques: torch.Tensor) -> torch.Tensor:
+        opposing = demonstrator_torques * feedback_torques < 0
+        limited = torch.sign(feedback_torques) * torch.minimum(torch.abs(demonstrator_torques), torch.abs(feedback_torques))
+        return torch.where(opposing, limited, torch.zeros_like(feedback_torques))
+
+    def _get_passive_feedback(self, joint_vel: torch.Tensor, feedback_torques: torch.Tensor) -> torch.Tensor:
+        damped = feedback_torques - self._force_feedback_damping_gain * joint_vel
+        return torch.where(damped * joint_vel > 0, torch.zeros_like(damped), damped)
 
     def forward(self, state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
         ### ATTENTION: state_dict["motor_torques_external"] are exactly opposite to the expectation
@@ -39,17 +62,10 @@ class ForceFeedbackController(HumanController):
         force_feedback_torques = self.replication_torques            
 
         if self._force_feedback:
-            return_torques = torch.zeros_like(motor_torques_external)
-            for idx in range(return_torques.size()[0]):
-                demonstrator_torque = motor_torques_external[idx]
-                feedback_torque = force_feedback_torques[idx]
-                if demonstrator_torque * feedback_torque >= 0:
-                    return_torques[idx] = 0
-                else:
-                    if abs(demonstrator_torque) <= abs(feedback_torque):
-                        return_torques[idx] = -demonstrator_torque
-                    else:
-                        return_torques[idx] = feedback_torque
-            return {"joint_torques": return_torques}
+            if self._feedback_mode == 0:
+                return {"joint_torques": self._get_clamped_feedback(motor_torques_external, force_feedback_torques)}
+            if self._feedback_mode == 1:
+                return {"joint_torques": self._feedback_scale * force_feedback_torques}
+            return {"joint_torques": self._get_passive_feedback(state_dict["joint_velocities"], force_feedback_torques)}
         else:
-            return {"joint_torques": assistive_torques + centering_torques}
\ No newline at end of file
+            return {"joint_torques": assistive_torques + centering_torques}
@@ -0,0 +1,98 @@
+from typing import Dict
+
+import torch
+import torchcontrol as toco
+from torchcontrol.utils.tensor_utils import to_tensor
+
+class ProDMPTorqueExecutor(toco.PolicyModule):
+    def __init__(
+        self,
+        times: torch.Tensor,
+        basis: torch.Tensor,
+        init: torch.Tensor,
+        weights: torch.Tensor,
+        goal: torch.Tensor,
+        time_scale: float = 1.0,
+        hz: int = 1000,
+        armed: bool = False,
+        joint_pos_hold: torch.Tensor = None,
+        Kq: torch.Tensor = None,
+        Kqd: torch.Tensor = None,
+    ):
+        """Executes a torque trajectory given as ProDMP, the torques are evaluated at the current time of the MP
+
+            Only the weights and the tabulated basis are part of the policy (see tabulate_prodmp), so the size of the policy
+            does not depend on the length of the trajectory. The MP can be changed while it is executed with
+            update_current_policy: "time_scale" (speed of the MP time relative to the control time, > 1 plays faster),
+            "goal" (final torques) and "weights".
+
+            An armed executor waits for update_current_policy({"started": torch.ones(1)}) before it executes the trajectory,
+            while waiting it holds joint_pos_hold with a joint space PD controller (see TorqueTrajectoryExecutor).
+
+        Args:
+            times (torch.Tensor): equally spaced MP times of the table starting at 0 with shape [num_points] (ends at tau)
+            basis (torch.Tensor): tabulated basis (last column belongs to the goal) with shape [num_points, num_basis + 1]
+            init (torch.Tensor): tabulated initial condition part with shape [num_points, num_dof]
+            weights (torch.Tensor): weights with shape [num_dof, num_basis]
+            goal (torch.Tensor): goal with shape [num_dof]
+            time_scale (float, optional): initial time scale. Defaults to 1.0.
+            hz (int, optional): control frequency of the robot. Defaults to 1000.
+            armed (bool, optional): wait for the start signal. Defaults to False.
+            joint_pos_hold (torch.Tensor, optional): joint positions held while waiting. Defaults to None.
+            Kq (torch.Tensor, optional): stiffness of the hold controller (required with joint_pos_hold). Defaults to None.
+            Kqd (torch.Tensor, optional): damping of the hold controller (required with joint_pos_hold). Defaults to None.
+        """
+        super().__init__()
+        self.basis = to_tensor(basis)
+        self.init = to_tensor(init)
+        self.num_points = self.basis.size(0)
+        self.tau = float(times[-1])
+        self.table_dt = self.tau / (self.num_points - 1)
+        self.dt = 1.0 / hz
+        num_dof = self.init.size(1)
+
+        # MP parameters that can be updated during the execution
+        self.weights = torch.nn.Parameter(to_tensor(weights))
+        self.goal = torch.nn.Parameter(to_tensor(goal))
+        self.time_scale = torch.nn.Parameter(torch.tensor([float(time_scale)]))
+
+        # Initialize MP time
+        self.t = 0.0
+
+        # Start signal and hold controller
+        self.started = torch.nn.Parameter(torch.zeros(1) if armed else torch.ones(1))
+        self.hold_position = joint_pos_hold is not None
+        if self.hold_position:
+            self.joint_pos_hold = to_tensor(joint_pos_hold)
+            self.hold_pd = toco.modules.feedback.JointSpacePD(to_tensor(Kq), to_tensor(Kqd))
+        else:
+            self.joint_pos_hold = torch.zeros(num_dof)
+            self.hold_pd = toco.modules.feedback.JointSpacePD(torch.zeros(num_dof), torch.zeros(num_dof))
+
+    def forward(self, state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        # Hold the start position until the start signal
+        if bool(self.started[0] < 0.5):
+            if self.hold_position:
+                joint_pos_current = state_dict["joint_positions"]
+                joint_vel_current = state_dict["joint_velocities"]
+                return {"joint_torques": self.hold_pd(joint_pos_current, joint_vel_current,
+                                                      self.joint_pos_hold, torch.zeros_like(joint_vel_current))}
+            return {"joint_torques": torch.zeros_like(self.goal)}
+
+        # Interpolate the table at the MP time
+        t = min(self.t, self.tau)
+        position = t / self.table_dt
+        idx = min(int(position), self.num_points - 2)
+        w = min(max(position - idx, 0.0), 1.0)
+        basis = (1 - w) * self.basis[idx, :] + w * self.basis[idx + 1, :]
+        init = (1 - w) * self.init[idx, :] + w * self.init[idx + 1, :]
+
+        # Evaluate the MP
+        joint_torque_desired = init + torch.mv(self.weights, basis[:-1]) + basis[-1] * self.goal
+
+        # Advance the MP time & termination (after the end of the MP was reached)
+        self.t = self.t + self.dt * float(self.time_scale[0])
+        if t + 0.5 * self.dt * float(self.time_scale[0]) >= self.tau:
+            self.set_terminated()
+
+        return {"joint_torques": joint_torque_desired}
@@ -0,0 +1,169 @@
+from typing import Dict, Iterator, Tuple
+
+import torch
+import torchcontrol as toco
+from torchcontrol.utils.tensor_utils import to_tensor
+
+def _chunk(joint_torque_trajectory: torch.Tensor, chunk_idx: int, chunk_size: int) -> torch.Tensor:
+    chunk = torch.zeros(chunk_size, joint_torque_trajectory.size(1))
+    knots = joint_torque_trajectory[chunk_idx * chunk_size:(chunk_idx + 1) * chunk_size]
+    chunk[:len(knots)] = knots
+    return chunk
+
+# the buffer of a chunk is refilled while the two chunks before it are played
+NUM_BUFFERS = 3
+
+def chunk_updates(joint_torque_trajectory: torch.Tensor,
+                  chunk_size: int,
+                  knot_dt: float,
+                  margin: float = 0.5) -> Iterator[Tuple[float, Dict[str, torch.Tensor]]]:
+    """Yields the updates that refill the buffers of a StreamingTorqueTrajectoryExecutor
+    (the first NUM_BUFFERS chunks are part of the executor itself).
+
+        A buffer is refilled margin chunks after the chunk it held was played out (on the clock of the host),
+        so the robot may be behind the host by up to margin chunks without losing a chunk and
+        the update still arrives (2 - margin) chunks before the robot needs it.
+
+    Args:
+        joint_torque_trajectory (torch.Tensor): the full torque trajectory with shape [N, num_dof]
+        chunk_size (int): number of knots per buffer (as given to the executor)
+        knot_dt (float): time between two knots in s (as given to the executor)
+        margin (float, optional): delay of the refill after the buffer was played out in chunks (0...2). Defaults to 0.5.
+
+    Yields:
+        Tuple[float, Dict[str, torch.Tensor]]: time after the start from which the update can be sent
+                                               and the update for update_current_policy
+    """
+    num_chunks = -(-len(joint_torque_trajectory) // chunk_size)
+    chunk_duration = chunk_size * knot_dt
+    for chunk_idx in range(NUM_BUFFERS, num_chunks):
+        buffer = chunk_idx % NUM_BUFFERS
+        yield ((chunk_idx - NUM_BUFFERS + 1 + margin) * chunk_duration,
+               {f"buffer_{buffer}": _chunk(joint_torque_trajectory, chunk_idx, chunk_size),
+                f"buffer_{buffer}_chunk": torch.tensor([float(chunk_idx)])})
+
+class StreamingTorqueTrajectoryExecutor(toco.PolicyModule):
+    def __init__(
+        self,
+        joint_torque_trajectory: torch.Tensor,
+        chunk_size: int = 1000,
+        knot_dt: float = None,
+        hz: int = 1000,
+        armed: bool = False,
+        joint_pos_hold: torch.Tensor = None,
+        Kq: torch.Tensor = None,
+        Kqd: torch.Tensor = None,
+    ):
+        """Executes a torque trajectory that is streamed to the policy in chunks
+
+            Only NUM_BUFFERS buffers of chunk_size knots are part of the policy, so the size of the policy
+            does not depend on the length of the trajectory. The first chunks are loaded initially,
+            the following ones have to be sent with update_current_policy (see chunk_updates) once a buffer is played out.
+            The knots are equally spaced by knot_dt and interpolated linearly.
+            If the next chunk is late, the last torques are held and the trajectory is continued once it arrived.
+            If a chunk that is still needed was already overwritten (the robot fell too far behind), the policy terminates.
+
+            An armed executor waits for update_current_policy({"started": torch.ones(1)}) before it executes the trajectory,
+            while waiting it holds joint_pos_hold with a joint space PD controller (see TorqueTrajectoryExecutor).
+
+        Args:
+            joint_torque_trajectory (torch.Tensor): the full torque trajectory [N, num_dof] (only the first NUM_BUFFERS chunks are stored)
+            chunk_size (int, optional): number of knots per buffer. Defaults to 1000.
+            knot_dt (float, optional): time between two knots in s. Defaults to None (1/hz).
+            hz (int, optional): control frequency of the robot. Defaults to 1000.
+            armed (bool, optional): wait for the start signal. Defaults to False.
+            joint_pos_hold (torch.Tensor, optional): joint positions held while waiting. Defaults to None.
+            Kq (torch.Tensor, optional): stiffness of the hold controller (required with joint_pos_hold). Defaults to None.
+            Kqd (torch.Tensor, optional): damping of the hold controller (required with joint_pos_hold). Defaults to None.
+        """
+        super().__init__()
+        joint_torque_trajectory = to_tensor(joint_torque_trajectory)
+        self.N = joint_torque_trajectory.size(0)
+        num_dof = joint_torque_trajectory.size(1)
+        self.chunk_size = chunk_size
+        self.dt = 1.0 / hz
+        self.knot_dt = knot_dt or self.dt
+        self.duration = (self.N - 1) * self.knot_dt
+
+        # Ring of buffers, refilled while the other buffers are played
+        self.num_buffers = NUM_BUFFERS
+        self.buffer_0 = torch.nn.Parameter(_chunk(joint_torque_trajectory, 0, chunk_size))
+        self.buffer_1 = torch.nn.Parameter(_chunk(joint_torque_trajectory, 1, chunk_size))
+        self.buffer_2 = torch.nn.Parameter(_chunk(joint_torque_trajectory, 2, chunk_size))
+        self.buffer_0_chunk = torch.nn.Parameter(torch.tensor([0.0]))
+        self.buffer_1_chunk = torch.nn.Parameter(torch.tensor([1.0]))
+        self.buffer_2_chunk = torch.nn.Parameter(torch.tensor([2.0]))
+
+        # Initialize step count
+        self.i = 0
+        self.underruns = 0
+        self.joint_torques_last = torch.zeros(num_dof)
+
+        # Start signal and hold controller
+        self.started = torch.nn.Parameter(torch.zeros(1) if armed else torch.ones(1))
+        self.hold_position = joint_pos_hold is not None
+        if self.hold_position:
+            self.joint_pos_hold = to_tensor(joint_pos_hold)
+            self.hold_pd = toco.modules.feedback.JointSpacePD(to_tensor(Kq), to_tensor(Kqd))
+        else:
+            self.joint_pos_hold = torch.zeros(num_dof)
+            self.hold_pd = toco.modules.feedback.JointSpacePD(torch.zeros(num_dof), torch.zeros(num_dof))
+
+    def _loaded_chunk(self, chunk_idx: int) -> int:
+        # chunk currently held by the buffer of chunk_idx
+        buffer = chunk_idx % self.num_buffers
+        if buffer == 0:
+            return int(self.buffer_0_chunk[0])
+        if buffer == 1:
+            return int(self.buffer_1_chunk[0])
+        return int(self.buffer_2_chunk[0])
+
+    def _knot(self, idx: int) -> torch.Tensor:
+        # the chunk of the knot has to be loaded
+        chunk_idx = idx // self.chunk_size
+        buffer = chunk_idx % self.num_buffers
+        if buffer == 0:
+            return self.buffer_0[idx - chunk_idx * self.chunk_size, :]
+        if buffer == 1:
+            return self.buffer_1[idx - chunk_idx * self.chunk_size, :]
+        return self.buffer_2[idx - chunk_idx * self.chunk_size, :]
+
+    def forward(self, state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        # Hold the start position until the start signal
+        if bool(self.started[0] < 0.5):
+            if self.hold_position:
+                joint_pos_current = state_dict["joint_positions"]
+                joint_vel_current = state_dict["joint_velocities"]
+                return {"joint_torques": self.hold_pd(joint_pos_current, joint_vel_current,
+                                                      self.joint_pos_hold, torch.zeros_like(joint_vel_current))}
+            return {"joint_torques": torch.zeros_like(self.joint_torques_last)}
+
+        # Knots around the elapsed time
+        t = self.i * self.dt
+        position = t / self.knot_dt
+        idx = min(int(position + 1e-9), self.N - 1)
+        idx_next = min(idx + 1, self.N - 1)
+        w = min(max(position - idx, 0.0), 1.0)
+        chunk_idx = idx // self.chunk_size
+        chunk_idx_next = idx_next // self.chunk_size
+        loaded = self._loaded_chunk(chunk_idx)
+        loaded_next = self._loaded_chunk(chunk_idx_next)
+        if loaded > chunk_idx or loaded_next > chunk_idx_next:
+            # a needed chunk was overwritten, it is not sent again
+            self.set_terminated()
+            return {"joint_torques": self.joint_torques_last}
+        if loaded < chunk_idx or loaded_next < chunk_idx_next:
+            # the next chunk is late, pause the trajectory
+            self.underruns += 1
+            return {"joint_torques": self.joint_torques_last}
+
+        # Query plan for desired state
+        joint_torque_desired = (1 - w) * self._knot(idx) + w * self._knot(idx_next)
+        self.joint_torques_last = joint_torque_desired
+
+        # Increment & termination (after the last knot was reached)
+        self.i += 1
+        if t + 0.5 * self.dt >= self.duration:
+            self.set_terminated()
+
+        return {"joint_torques": joint_torque_desired}
@@ -1,37 +1,166 @@
-from typing import Dict, List
+from typing import Dict, List, Union
 
 import torch
 import torchcontrol as toco
 from torchcontrol.utils.tensor_utils import stack_trajectory, to_tensor
 
+INTERPOLATIONS = ["linear", "cubic"]
+# relative deviation of the knot spacing up to which knots count as equally spaced (timestamp jitter)
+EQUAL_SPACING_TOLERANCE = 0.1
+
+def natural_spline_second_derivatives(times: torch.Tensor, values: torch.Tensor) -> torch.Tensor:
+    """Computes the second derivatives of a natural cubic spline through the knots (Thomas algorithm).
+
+    Args:
+        times (torch.Tensor): strictly increasing knot times with shape [N]
+        values (torch.Tensor): knot values with shape [N, num_dof]
+
+    Returns:
+        torch.Tensor: second derivatives at the knots with shape [N, num_dof] (zero at both ends)
+    """
+    times = times.double()
+    values = values.double()
+    N = len(times)
+    second_derivatives = torch.zeros_like(values)
+    if N < 3:
+        return second_derivatives
+    h = times[1:] - times[:-1]
+    slopes = (values[1:] - values[:-1]) / h[:, None]
+    # tridiagonal system of the inner knots: h[k-1] M[k-1] + 2 (h[k-1] + h[k]) M[k] + h[k] M[k+1] = 6 (slopes[k] - slopes[k-1])
+    diagonal = 2 * (h[:-1] + h[1:])
+    rhs = 6 * (slopes[1:] - slopes[:-1])
+    for k in range(1, N - 2):
+        factor = h[k] / diagonal[k - 1]
+        diagonal[k] -= factor * h[k]
+        rhs[k] -= factor * rhs[k - 1]
+    second_derivatives[N - 2] = rhs[-1] / diagonal[-1]
+    for k in range(N - 3, 0, -1):
+        second_derivatives[k] = (rhs[k - 1] - h[k] * second_derivatives[k + 1]) / diagonal[k - 1]
+    return second_derivatives
+
 class TorqueTrajectoryExecutor(toco.PolicyModule):
     def __init__(
         self,
-        joint_torque_trajectory: List[torch.Tensor],
+        joint_torque_trajectory: Union[torch.Tensor, List[torch.Tensor]],
+        times: torch.Tensor = None,
+        hz: int = 1000,
+        interpolation: str = "linear",
+        armed: bool = False,
+        joint_pos_hold: torch.Tensor = None,
+        Kq: torch.Tensor = None,
+        Kqd: torch.Tensor = None,
     ):
         """Executes a torque trajectory
 
+            The trajectory is given as knots on a time axis, the torques in between are interpolated
+            from the time elapsed since the start (control ticks / hz). So trajectories can be recorded
+            at lower rates than the controller (or be downsampled) and still play back with the correct timing.
+            Without a time axis the knots are assumed to be recorded at the control frequency.
+            For equally spaced knots (up to timestamp jitter) only the spacing is stored, not the time axis.
+
+            An armed executor waits for update_current_policy({"started": torch.ones(1)}) before it executes the trajectory,
+            so it can be sent to several robots ahead of a synchronized start.
+            While waiting it holds joint_pos_hold with a joint space PD controller (or commands zero torques if not given).
+
         Args:
-            joint_torque_trajectory (List[torch.Tensor]): the torque trajectory to be executed  
+            joint_torque_trajectory (Union[torch.Tensor, List[torch.Tensor]]): the torque trajectory to be executed
+                                                                                (stacked [N, num_dof] or list of N torques)
+            times (torch.Tensor, optional): strictly increasing time of each knot in s with shape [N]. Defaults to None (1/hz spacing).
+            hz (int, optional): control frequency of the robot. Defaults to 1000.
+            interpolation (str, optional): "linear" or "cubic" (natural cubic spline). Defaults to "linear".
+            armed (bool, optional): wait for the start signal. Defaults to False.
+            joint_pos_hold (torch.Tensor, optional): joint positions held while waiting. Defaults to None.
+            Kq (torch.Tensor, optional): stiffness of the hold controller (required with joint_pos_hold). Defaults to None.
+            Kqd (torch.Tensor, optional): damping of the hold controller (required with joint_pos_hold). Defaults to None.
         """
         super().__init__()
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation {interpolation}, expected one of {INTERPOLATIONS}.")
 
-        self.joint_torque_trajectory = to_tensor(stack_trajectory(joint_torque_trajectory))
+        if isinstance(joint_torque_trajectory, torch.Tensor):
+            self.joint_torque_trajectory = to_tensor(joint_torque_trajectory.clone())
+        else:
+            self.joint_torque_trajectory = to_tensor(stack_trajectory(joint_torque_trajectory))
 
         self.N = self.joint_torque_trajectory.size(0)
-        # Initialize step count
+        num_dof = self.joint_torque_trajectory.size(1)
+        self.dt = 1.0 / hz
+
+        # Time axis of the knots (relative to the first knot),
+        # only stored per knot if the knots are not equally spaced to keep the policy small
+        if times is None:
+            times = torch.arange(self.N, dtype=torch.float64) * self.dt
+        else:
+            if len(times) != self.N:
+                raise ValueError(f"Got {len(times)} times for {self.N} torques.")
+            times = torch.as_tensor(times).double()
+            times = times - times[0]
+            if self.N > 1 and not bool((times[1:] > times[:-1]).all()):
+                raise ValueError("The times of the torque trajectory have to be strictly increasing.")
+        self.duration = float(times[-1])
+        self.knot_dt = self.duration / (self.N - 1) if self.N > 1 else self.dt
+        spacing = times[1:] - times[:-1]
+        self.equally_spaced = self.N < 2 or bool(((spacing - self.knot_dt).abs() <= EQUAL_SPACING_TOLERANCE * self.knot_dt).all())
+        self.times = torch.zeros(0, dtype=torch.float64) if self.equally_spaced else times
+        self.cubic = interpolation == "cubic"
+        if self.cubic:
+            knot_times = torch.arange(self.N, dtype=torch.float64) * self.knot_dt if self.equally_spaced else times
+            self.second_derivatives = natural_spline_second_derivatives(knot_times, self.joint_torque_trajectory).to(
+                self.joint_torque_trajectory.dtype)
+        else:
+            self.second_derivatives = torch.zeros(0, num_dof)
+
+        # Initialize step count and current knot
         self.i = 0
+        self.k = 0
+
+        # Start signal and hold controller
+        self.started = torch.nn.Parameter(torch.zeros(1) if armed else torch.ones(1))
+        self.hold_position = joint_pos_hold is not None
+        if self.hold_position:
+            self.joint_pos_hold = to_tensor(joint_pos_hold)
+            self.hold_pd = toco.modules.feedback.JointSpacePD(to_tensor(Kq), to_tensor(Kqd))
+        else:
+            self.joint_pos_hold = torch.zeros(num_dof)
+            self.hold_pd = toco.modules.feedback.JointSpacePD(torch.zeros(num_dof), torch.zeros(num_dof))
+
+    def _knot_time(self, k: int) -> float:
+        if self.equally_spaced:
+            return k * self.knot_dt
+        return float(self.times[k])
 
     def forward(self, state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
-        # Parse current state
-        joint_torque_current = state_dict["motor_torques_measured"]
+        # Hold the start position until the start signal
+        if bool(self.started[0] < 0.5):
+            if self.hold_position:
+                joint_pos_current = state_dict["joint_positions"]
+                joint_vel_current = state_dict["joint_velocities"]
+                return {"joint_torques": self.hold_pd(joint_pos_current, joint_vel_current,
+                                                      self.joint_pos_hold, torch.zeros_like(joint_vel_current))}
+            return {"joint_torques": torch.zeros_like(self.joint_torque_trajectory[0, :])}
+
+        # Find the knot interval of the elapsed time (the time only increases)
+        t = self.i * self.dt
+        if self.equally_spaced:
+            self.k = min(int(t / self.knot_dt + 1e-9), max(self.N - 2, 0))
+        else:
+            while self.k < self.N - 2 and t >= float(self.times[self.k + 1]):
+                self.k += 1
+        k_next = min(self.k + 1, self.N - 1)
+        t_k = self._knot_time(self.k)
+        h = self._knot_time(k_next) - t_k
+        w = min(max((t - t_k) / h, 0.0), 1.0) if h > 0 else 0.0
 
         # Query plan for desired state
-        joint_torque_desired = self.joint_torque_trajectory[self.i, :]
+        joint_torque_desired = (1 - w) * self.joint_torque_trajectory[self.k, :] + w * self.joint_torque_trajectory[k_next, :]
+        if self.cubic:
+            joint_torque_desired = joint_torque_desired + h * h / 6 * (
+                ((1 - w) ** 3 - (1 - w)) * self.second_derivatives[self.k, :]
+                + (w ** 3 - w) * self.second_derivatives[k_next, :])
 
-        # Increment & termination
+        # Increment & termination (after the last knot was reached)
         self.i += 1
-        if self.i == self.N:
+        if t + 0.5 * self.dt >= self.duration:
             self.set_terminated()
 
         return {"joint_torques": joint_torque_desired}
@@ -5,6 +5,11 @@ import pickle
 from typing import List
 import abc
 
+from data_management.demonstration import Demonstration
+from data_management.demonstration_cache import DemonstrationCache
+from data_management.demonstration_catalog import DemonstrationCatalog
+from data_management.robot_log import ROBOT_LOG_EXTENSION, RobotLog, compact_robot_log
+
 class BaseDataManager(threading.Thread, abc.ABC):
     def __init__(self, log_info:str = '', store_freq:float = None):
         """Base class for data management.
@@ -32,18 +37,55 @@ class BaseDataManager(threading.Thread, abc.ABC):
         self._split_event.set()
         self.logger.debug("Split event set.")
 
-    def _store_data(self, data, log_name):
+    @staticmethod
+    def _get_log_file_path(log_name: str, extension: str = ".pkl") -> str:
         current_dir = os.path.dirname(os.path.abspath(__file__))
         data_dir = os.path.join(current_dir, "data")
-        log_file_path = os.path.join(data_dir, f"{log_name}.pkl")
+        return os.path.join(data_dir, f"{log_name}{extension}")
+
+    def _finalize_log(self, file_path: str, catalog_path: str = None):
+        """Compacts a written robot log and adds it to the demonstration catalog."""
+        compact_robot_log(file_path)
+        if catalog_path is not None:
+            try:
+                DemonstrationCatalog(catalog_path).add(file_path)
+            except Exception as e:
+                self.logger.error(f"Failed to add {file_path} to the demonstration catalog: {e}")
+
+    def _store_data(self, data, log_name):
+        log_file_path = self._get_log_file_path(log_name)
         with open(log_file_path, 'wb') as f:
             pickle.dump(data, f)
 
+    @staticmethod
+    def load_demonstrations(file_paths: List[str], use_cache: bool = True, background: bool = False) -> List[Demonstration]:
+        """Creates lazy handles for demonstration files. Robot logs are only read when their data is accessed.
+
+        Args:
+            file_paths (List[str]): paths of robot logs or legacy pickle files
+            use_cache (bool, optional): decode legacy pickle files in parallel and cache them on disk
+                                        (see DemonstrationCache). Defaults to True.
+            background (bool, optional): return before the legacy pickle files are decoded, the data access
+                                         of a demonstration waits for its decoding. Defaults to False.
+
+        Returns:
+            List[Demonstration]: one demonstration per file in the given order
+        """
+        if use_cache:
+            return DemonstrationCache().load(file_paths, background=background)
+        return [Demonstration(file_path) for file_path in file_paths]
+
     @staticmethod
     def get_demonstrations_from_files(file_paths: List[str]):
+        """Eagerly loads demonstration files as lists of RobotStates.
+        Prefer load_demonstrations, which does not decode the files.
+        """
         demonstrations = dict()
         for file_path in file_paths:
-            with open(file_path, 'rb') as f:
-                demonstration = pickle.load(f)
+            if file_path.endswith(ROBOT_LOG_EXTENSION):
+                demonstration = RobotLog(file_path).to_robot_states()
+            else:
+                with open(file_path, 'rb') as f:
+                    demonstration = pickle.load(f)
             demonstrations[file_path] = demonstration
         return demonstrations
\ No newline at end of file
@@ -0,0 +1,115 @@
+from typing import Dict, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def lowpass_fir(ratio: int, taps_per_ratio: int = 8, cutoff: float = 0.8) -> np.ndarray:
+    """Linear phase low-pass FIR filter (Hamming windowed sinc) for decimation.
+
+    Args:
+        ratio (int): decimation ratio
+        taps_per_ratio (int, optional): filter length in multiples of the ratio. Defaults to 8.
+        cutoff (float, optional): cutoff frequency relative to the Nyquist frequency after decimation. Defaults to 0.8.
+
+    Returns:
+        np.ndarray: filter coefficients (odd number, normalized to unit DC gain)
+    """
+    num_taps = taps_per_ratio * ratio + 1
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    cutoff_frequency = cutoff * 0.5 / ratio # in cycles per sample
+    taps = 2 * cutoff_frequency * np.sinc(2 * cutoff_frequency * n) * np.hamming(num_taps)
+    return taps / taps.sum()
+
+class _FieldDecimator:
+    def __init__(self, ratio: int, filtered: bool):
+        """Streaming decimator of a single field.
+        Output k is the (filtered) value at input sample k * ratio, the filter delay is compensated.
+        """
+        self.ratio = ratio
+        self.taps = lowpass_fir(ratio) if filtered and ratio > 1 else None
+        self.delay = 0 if self.taps is None else (len(self.taps) - 1) // 2
+        self.reset()
+
+    def reset(self):
+        self._buffer = None
+        self._buffer_start = 0 # input sample number of self._buffer[0]
+        self._num_inputs = 0
+        self._next_output = 0 # input sample number of the next output
+
+    def process(self, values: np.ndarray, final: bool = False) -> np.ndarray:
+        if self._buffer is None:
+            if len(values) == 0:
+                return values
+            # extend the signal with its first value before the start
+            self._buffer = np.concatenate((np.repeat(values[:1], self.delay, axis=0), values))
+            self._buffer_start = -self.delay
+        else:
+            self._buffer = np.concatenate((self._buffer, values))
+        self._num_inputs += len(values)
+        if final and self.delay > 0:
+            # extend the signal with its last value after the end
+            self._buffer = np.concatenate((self._buffer, np.repeat(self._buffer[-1:], self.delay, axis=0)))
+
+        last_input = min(self._num_inputs - 1, self._buffer_start + len(self._buffer) - 1 - self.delay)
+        if last_input < self._next_output:
+            return self._buffer[:0]
+        centers = np.arange(self._next_output, last_input + 1, self.ratio)
+        if self.taps is None:
+            output = self._buffer[centers - self._buffer_start]
+        else:
+            windows = sliding_window_view(self._buffer, len(self.taps), axis=0)
+            output = np.tensordot(windows[centers - self.delay - self._buffer_start], self.taps, axes=([-1], [0]))
+            output = output.astype(self._buffer.dtype)
+        self._next_output = int(centers[-1]) + self.ratio
+
+        # keep only the samples needed for the next outputs
+        drop = min(max(self._next_output - self.delay - self._buffer_start, 0), len(self._buffer))
+        self._buffer = self._buffer[drop:]
+        self._buffer_start += drop
+        return output
+
+class Decimator:
+    def __init__(self, fields: List[Dict], ratios: Dict[str, int], time_field: str):
+        """Block-wise anti-aliased decimation of logged fields with individual ratios.
+
+            Floating point fields are low-pass filtered with a linear phase FIR before they are subsampled,
+            all other fields (including the time field) are only subsampled.
+            The time field is kept at the smallest ratio. Sample k of a field with stride s
+            belongs to sample k * s of the time field (stored as "time_stride" in the field description).
+
+        Args:
+            fields (List[Dict]): field descriptions (name, dtype, shape) of the input
+            ratios (Dict[str, int]): decimation ratio of every field except the time field
+            time_field (str): name of the field with the timestamps
+        """
+        self.time_field = time_field
+        time_ratio = min(ratios.values())
+        if any(ratio % time_ratio != 0 for ratio in ratios.values()):
+            raise ValueError(f"All downsampling ratios have to be multiples of the smallest one ({time_ratio}).")
+        self.ratios = {**ratios, time_field: time_ratio}
+        self.fields = [{**field, "time_stride": self.ratios[field["name"]] // time_ratio} for field in fields]
+        self._decimators = {field["name"]: _FieldDecimator(self.ratios[field["name"]], np.dtype(field["dtype"]).kind == 'f')
+                            for field in fields}
+
+    def process(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Decimates the next block of samples.
+
+        Args:
+            columns (Dict[str, np.ndarray]): one array per field with the samples as first dimension
+
+        Returns:
+            Dict[str, np.ndarray]: decimated fields (lengths may differ between fields)
+        """
+        return {name: decimator.process(columns[name]) for name, decimator in self._decimators.items()}
+
+    def finish(self) -> Dict[str, np.ndarray]:
+        """Returns the remaining samples at the end of the signal and resets the decimator."""
+        output = dict()
+        for name, decimator in self._decimators.items():
+            if decimator._buffer is None:
+                field = next(field for field in self.fields if field["name"] == name)
+                output[name] = np.empty((0, *field["shape"]), dtype=np.dtype(field["dtype"]))
+            else:
+                output[name] = decimator.process(decimator._buffer[:0], final=True)
+            decimator.reset()
+        return output
@@ -0,0 +1,257 @@
+from concurrent.futures import Future
+import pickle
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from data_management.robot_log import ROBOT_LOG_EXTENSION, TIMESTAMP_FIELD, RobotLog, robot_states_to_columns
+
+class _DemonstrationSource:
+    def __init__(self, file_path: str, ready: Future = None):
+        """Opens a demonstration file on first access and keeps it open for all views on it.
+
+        Args:
+            file_path (str): path of a robot log or a legacy pickle file
+            ready (Future, optional): completed once the file is written (see DemonstrationCache). Defaults to None.
+        """
+        self.file_path = file_path
+        self._ready = ready
+        self._columns = None
+        self._time_ns = None
+        self._time = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            if self._ready is not None:
+                # raises if the file could not be written
+                self._ready.result()
+                self._ready = None
+            if self.file_path.endswith(ROBOT_LOG_EXTENSION):
+                self._columns = RobotLog(self.file_path)
+            else:
+                with open(self.file_path, 'rb') as f:
+                    self._columns = robot_states_to_columns(pickle.load(f))
+        return self._columns
+
+    @property
+    def time_ns(self) -> np.ndarray:
+        """time since the first sample in ns (int64), computed once for all views"""
+        if self._time_ns is None:
+            timestamps = np.asarray(self.columns[TIMESTAMP_FIELD])
+            self._time_ns = timestamps - timestamps[0] if len(timestamps) > 0 else timestamps.astype(np.int64)
+        return self._time_ns
+
+    @property
+    def time(self) -> np.ndarray:
+        """time since the first sample in s (float64), computed once for all views"""
+        if self._time is None:
+            self._time = self.time_ns * 1e-9
+        return self._time
+
+class Demonstration:
+    def __init__(self, file_path: str, cache_file_path: str = None, ready: Future = None):
+        """Lazy handle on a recorded demonstration.
+
+            The file is only opened when a field is accessed for the first time.
+            Fields are returned as tensors that share memory with the (memory-mapped) log,
+            no RobotState objects are created.
+
+        Args:
+            file_path (str): path of a robot log (*.famlog) or a legacy pickle file (*.pkl)
+            cache_file_path (str, optional): robot log containing the decoded data of file_path, 
+                                             see DemonstrationCache. Defaults to None.
+            ready (Future, optional): completed once cache_file_path is written, the data access waits for it. Defaults to None.
+        """
+        self.file_path = file_path
+        self._source = _DemonstrationSource(file_path if cache_file_path is None else cache_file_path, ready)
+        self._start = 0
+        self._stop = None
+        self._robot = None
+        self._time_ns = None
+        self._time = None
+
+    def _view(self, start: int, stop: int, robot: str = None) -> "Demonstration":
+        view = Demonstration.__new__(Demonstration)
+        view.file_path = self.file_path
+        view._source = self._source
+        view._start = start
+        view._stop = stop
+        view._robot = robot
+        view._time_ns = None
+        view._time = None
+        return view
+
+    def _field_name(self, name: str) -> str:
+        if self._robot is None or name == TIMESTAMP_FIELD:
+            return name
+        return f"{self._robot}/{name}"
+
+    @property
+    def robots(self) -> List[str]:
+        """robots of a time-aligned multi-robot recording (see MultiRobotDataManager), empty for the view on one robot"""
+        if self._robot is not None:
+            return []
+        return [name.split("/")[0] for name in self._all_field_names() if name.endswith("/joint_positions")]
+
+    def robot(self, robot: str) -> "Demonstration":
+        """Returns a view on the fields of one robot of a time-aligned multi-robot recording.
+
+        Args:
+            robot (str): name of the robot (see robots)
+
+        Returns:
+            Demonstration: demonstration with the fields of the robot and the shared time axis
+        """
+        return self._view(self._start, self._stop, robot)
+
+    def _slice(self) -> slice:
+        stop = len(self._source.columns[TIMESTAMP_FIELD]) if self._stop is None else self._stop
+        return slice(self._start, stop)
+
+    def __len__(self) -> int:
+        index = self._slice()
+        return index.stop - index.start
+
+    def field(self, name: str) -> torch.Tensor:
+        """Returns the samples of a field of the recorded robot states.
+
+        Args:
+            name (str): name of the field (e.g. "joint_positions", see data_management.robot_log)
+
+        Returns:
+            torch.Tensor: samples of the field with shape [num_samples, *field_shape]
+        """
+        name = self._field_name(name)
+        index = self._slice()
+        stride = self._time_stride(name)
+        if stride > 1:
+            # decimated fields only have a sample at every stride-th timestamp
+            index = slice(-(-index.start // stride), -(-index.stop // stride))
+        return torch.from_numpy(np.asarray(self._source.columns[name][index]))
+
+    def _time_stride(self, name: str) -> int:
+        columns = self._source.columns
+        return columns.time_stride(name) if isinstance(columns, RobotLog) else 1
+
+    def field_timestamps(self, name: str) -> torch.Tensor:
+        """Returns the absolute timestamps in ns (int64) of the samples of a field.
+        They differ from timestamps for fields that are stored at a lower rate (see RobotDataManager).
+
+        Args:
+            name (str): name of the field
+
+        Returns:
+            torch.Tensor: timestamps with shape [num_samples]
+        """
+        index = self._slice()
+        stride = self._time_stride(self._field_name(name))
+        start = -(-index.start // stride) * stride
+        return torch.from_numpy(np.asarray(self._source.columns[TIMESTAMP_FIELD][start:index.stop:stride]))
+
+    def _field_time_axis(self, time_axis: np.ndarray, name: str) -> torch.Tensor:
+        stride = self._time_stride(self._field_name(name))
+        if stride == 1:
+            return torch.from_numpy(time_axis)
+        return torch.from_numpy(time_axis[(-self._start) % stride::stride])
+
+    def field_time_ns(self, name: str) -> torch.Tensor:
+        """Returns the time axis of a field in ns since the start of the demonstration (int64, see field_timestamps)."""
+        return self._field_time_axis(self._time_axis_ns(), name)
+
+    def field_time(self, name: str) -> torch.Tensor:
+        """Returns the time axis of a field in s since the start of the demonstration (float64, see field_timestamps)."""
+        return self._field_time_axis(self._time_axis(), name)
+
+    def _all_field_names(self) -> List[str]:
+        columns = self._source.columns
+        return columns.field_names if isinstance(columns, RobotLog) else list(columns.keys())
+
+    @property
+    def field_names(self) -> List[str]:
+        names = self._all_field_names()
+        if self._robot is None:
+            return names
+        # the shared time axis replaces the timestamps of the robot
+        prefix = f"{self._robot}/"
+        return [TIMESTAMP_FIELD] + [name[len(prefix):] for name in names
+                                    if name.startswith(prefix) and name != prefix + TIMESTAMP_FIELD]
+
+    def fields(self) -> Dict[str, torch.Tensor]:
+        return {name: self.field(name) for name in self.field_names}
+
+    @property
+    def timestamps(self) -> torch.Tensor:
+        """absolute timestamps in ns (int64)"""
+        return self.field(TIMESTAMP_FIELD)
+
+    def _time_axis_ns(self) -> np.ndarray:
+        if self._time_ns is None:
+            index = self._slice()
+            time_ns = self._source.time_ns[index]
+            # views starting later are shifted once, the full demonstration shares the axis of its source
+            self._time_ns = time_ns - time_ns[0] if index.start > 0 and len(time_ns) > 0 else time_ns
+        return self._time_ns
+
+    def _time_axis(self) -> np.ndarray:
+        if self._time is None:
+            if self._start == 0:
+                self._time = self._source.time[self._slice()]
+            else:
+                self._time = self._time_axis_ns() * 1e-9
+        return self._time
+
+    @property
+    def time_ns(self) -> torch.Tensor:
+        """time since the start of the demonstration in ns (int64), computed once and shared"""
+        return torch.from_numpy(self._time_axis_ns())
+
+    @property
+    def time(self) -> torch.Tensor:
+        """time since the start of the demonstration in s (float64), computed once and shared"""
+        return torch.from_numpy(self._time_axis())
+
+    @property
+    def joint_positions(self) -> torch.Tensor:
+        return self.field("joint_positions")
+
+    @property
+    def joint_velocities(self) -> torch.Tensor:
+        return self.field("joint_velocities")
+
+    @property
+    def joint_torques_computed(self) -> torch.Tensor:
+        return self.field("joint_torques_computed")
+
+    @property
+    def motor_torques_measured(self) -> torch.Tensor:
+        return self.field("motor_torques_measured")
+
+    @property
+    def motor_torques_external(self) -> torch.Tensor:
+        return self.field("motor_torques_external")
+
+    def slice(self, start_time: float = None, end_time: float = None) -> "Demonstration":
+        """Returns a view on the samples within a time range. The file is not read again.
+
+        Args:
+            start_time (float, optional): start of the range in s since the start of this demonstration. Defaults to None.
+            end_time (float, optional): end of the range (exclusive) in s since the start of this demonstration. Defaults to None.
+
+        Returns:
+            Demonstration: demonstration containing only the samples within the range
+        """
+        index = self._slice()
+        time_ns = self._time_axis_ns()
+        start, stop = 0, len(time_ns)
+        if start_time is not None:
+            start = int(np.searchsorted(time_ns, int(start_time * 1e9), side='left'))
+        if end_time is not None:
+            stop = int(np.searchsorted(time_ns, int(end_time * 1e9), side='left'))
+        return self._view(index.start + start, index.start + max(start, stop), self._robot)
+
+    def __repr__(self) -> str:
+        if self._robot is not None:
+            return f"Demonstration({self.file_path!r}, robot={self._robot!r})"
+        return f"Demonstration({self.file_path!r})"
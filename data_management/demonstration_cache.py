@@ -0,0 +1,111 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import threading
+from typing import Dict, List
+
+from data_management.demonstration import Demonstration
+from data_management.robot_log import ROBOT_LOG_EXTENSION, RobotLogWriter
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "demonstrations")
+
+def _decode_to_cache(file_path: str, cache_file_path: str):
+    # executed in the worker processes, has to be a module level function
+    with open(file_path, 'rb') as f:
+        robot_states = pickle.load(f)
+    tmp_file_path = f"{cache_file_path}.{os.getpid()}.tmp"
+    RobotLogWriter.write_robot_states(tmp_file_path, robot_states, {"source": os.path.abspath(file_path)})
+    os.replace(tmp_file_path, cache_file_path)
+
+class DemonstrationCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_workers: int = None):
+        """On-disk cache of decoded demonstrations.
+
+            Legacy pickle files are decoded once into columnar robot logs, in parallel in a process pool.
+            Cache entries are keyed by path, modification time and size of the source file,
+            so modified files are decoded again. Robot logs are already columnar and are used directly.
+
+        Args:
+            cache_dir (str, optional): directory of the cache entries. Defaults to DEFAULT_CACHE_DIR.
+            max_workers (int, optional): number of decoding processes. Defaults to None (number of CPUs).
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+
+    def get_cache_file_path(self, file_path: str) -> str:
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        key = hashlib.sha1(f"{file_path}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}{ROBOT_LOG_EXTENSION}")
+
+    def load(self, file_paths: List[str], background: bool = False) -> List[Demonstration]:
+        """Loads demonstrations, decoding all files that are not cached yet.
+
+        Args:
+            file_paths (List[str]): paths of robot logs or legacy pickle files
+            background (bool, optional): return right away and decode in a background thread,
+                                         the demonstrations wait for their decoding when their data is accessed
+                                         (e.g. so the GUI thread is not blocked). Defaults to False.
+
+        Returns:
+            List[Demonstration]: one demonstration per file in the given order
+        """
+        demonstrations = []
+        to_decode = dict()
+        decoded = dict()
+        for file_path in file_paths:
+            if file_path.endswith(ROBOT_LOG_EXTENSION):
+                demonstrations.append(Demonstration(file_path))
+                continue
+            cache_file_path = self.get_cache_file_path(file_path)
+            if not os.path.exists(cache_file_path) and file_path not in to_decode:
+                to_decode[file_path] = cache_file_path
+                decoded[file_path] = Future()
+            demonstrations.append(Demonstration(file_path, cache_file_path=cache_file_path, ready=decoded.get(file_path)))
+        if len(to_decode) > 0:
+            if background:
+                threading.Thread(target=self._decode, args=(to_decode, decoded), daemon=True).start()
+            else:
+                self._decode(to_decode, decoded)
+                for future in decoded.values():
+                    future.result()
+        return demonstrations
+
+    def _decode(self, to_decode: Dict[str, str], decoded: Dict[str, Future]):
+        # the futures are resolved once the file is decoded (or decoding failed)
+        self.logger.info(f"Decoding {len(to_decode)} demonstration(s)...")
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if len(to_decode) == 1:
+                for file_path, cache_file_path in to_decode.items():
+                    _decode_to_cache(file_path, cache_file_path)
+                    decoded[file_path].set_result(cache_file_path)
+            else:
+                max_workers = min(len(to_decode), self.max_workers or os.cpu_count())
+                # spawn instead of fork, the GUI process runs gRPC and Tk threads
+                with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    for file_path, cache_file_path in to_decode.items():
+                        executor.submit(_decode_to_cache, file_path, cache_file_path).add_done_callback(
+                            lambda future, file_path=file_path: self._resolve(decoded[file_path], future))
+        except Exception as e:
+            # nobody would wait for the remaining files otherwise
+            for future in decoded.values():
+                if not future.done():
+                    future.set_exception(e)
+        self.logger.info("Demonstrations decoded.")
+
+    @staticmethod
+    def _resolve(decoded: Future, future: Future):
+        if future.exception() is not None:
+            decoded.set_exception(future.exception())
+        else:
+            decoded.set_result(future.result())
+
+    def clear(self):
+        """Removes all cache entries."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
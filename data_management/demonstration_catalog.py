@@ -0,0 +1,227 @@
+from contextlib import contextmanager
+import json
+import logging
+import os
+import re
+import sqlite3
+from typing import Dict, List
+
+from data_management.demonstration import Demonstration
+from data_management.robot_log import ROBOT_LOG_EXTENSION
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_CATALOG_PATH = os.path.join(DATA_DIR, "catalog.sqlite")
+
+# fields that are summarized per joint (min, max, mean, std)
+SUMMARY_FIELDS = ["joint_positions", "joint_torques_computed", "motor_torques_external"]
+
+# <date>_<log_info> - Robot N_SPLIT_k as written by RobotDataManager/LoggingControl
+_LOG_NAME_PATTERN = re.compile(r"^(?P<date>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_(?P<log_info>.*?)"
+                               r"(?: - (?P<robot>Robot \d+))?_SPLIT_(?P<split>\d+)$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS demonstrations (
+    file_path TEXT PRIMARY KEY,
+    file_mtime_ns INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    recording_date TEXT,
+    robot TEXT,
+    log_info TEXT,
+    split INTEGER,
+    num_samples INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    start_time_ns INTEGER,
+    end_time_ns INTEGER,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS demonstrations_robot ON demonstrations (robot);
+CREATE INDEX IF NOT EXISTS demonstrations_log_info ON demonstrations (log_info);
+CREATE INDEX IF NOT EXISTS demonstrations_start_time ON demonstrations (start_time_ns);
+"""
+
+def parse_log_name(file_path: str) -> Dict:
+    """Extracts recording date, log info, robot and split number from the name of a log file.
+
+    Args:
+        file_path (str): path of a log file written by RobotDataManager
+
+    Returns:
+        Dict: recording_date, log_info, robot and split (None if the name does not match)
+    """
+    log_name = os.path.splitext(os.path.basename(file_path))[0]
+    match = _LOG_NAME_PATTERN.match(log_name)
+    if match is None:
+        return {"recording_date": None, "log_info": log_name, "robot": None, "split": None}
+    return {"recording_date": match["date"],
+            "log_info": match["log_info"],
+            "robot": match["robot"],
+            "split": int(match["split"])}
+
+class DemonstrationCatalog:
+    def __init__(self, db_path: str = DEFAULT_CATALOG_PATH):
+        """Persistent SQLite index of recorded demonstrations.
+
+            Stores robot, log info, split number, sample count, duration, time range and
+            per-joint summaries of every demonstration, so they can be filtered without opening the data files.
+            Every call opens its own connection, so the catalog can be shared between threads.
+
+        Args:
+            db_path (str, optional): path of the SQLite database. Defaults to DEFAULT_CATALOG_PATH.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection: # commits or rolls back
+                yield connection
+        finally:
+            connection.close()
+
+    def _to_catalog_path(self, file_path: str) -> str:
+        # files next to the catalog are stored relative to it, so the data directory can be moved
+        file_path = os.path.abspath(file_path)
+        catalog_dir = os.path.dirname(os.path.abspath(self.db_path))
+        if os.path.commonpath([file_path, catalog_dir]) == catalog_dir:
+            return os.path.relpath(file_path, catalog_dir)
+        return file_path
+
+    def _from_catalog_path(self, file_path: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_path)), file_path)
+
+    @staticmethod
+    def _summarize(demonstration: Demonstration) -> Dict:
+        summary = dict()
+        # multi-robot recordings contain the fields once per robot ("<robot>/<field>")
+        names = [name for name in demonstration.field_names if name.split("/")[-1] in SUMMARY_FIELDS]
+        for name in names:
+            values = demonstration.field(name).double()
+            if len(values) == 0:
+                continue
+            summary[name] = {"min": values.min(dim=0).values.tolist(),
+                             "max": values.max(dim=0).values.tolist(),
+                             "mean": values.mean(dim=0).tolist(),
+                             "std": values.std(dim=0, unbiased=False).tolist()}
+        return summary
+
+    def add(self, file_path: str, demonstration: Demonstration = None):
+        """Adds a demonstration to the catalog or updates its entry.
+
+        Args:
+            file_path (str): path of the demonstration file
+            demonstration (Demonstration, optional): already opened handle of the file. Defaults to None.
+        """
+        if demonstration is None:
+            demonstration = Demonstration(file_path)
+        timestamps = demonstration.timestamps
+        start_time_ns = int(timestamps[0]) if len(timestamps) > 0 else None
+        end_time_ns = int(timestamps[-1]) if len(timestamps) > 0 else None
+        duration = (end_time_ns - start_time_ns) * 1e-9 if len(timestamps) > 0 else 0.0
+        stat = os.stat(file_path)
+        row = {"file_path": self._to_catalog_path(file_path),
+               "file_mtime_ns": stat.st_mtime_ns,
+               "file_size": stat.st_size,
+               **parse_log_name(file_path),
+               "num_samples": len(timestamps),
+               "duration": duration,
+               "start_time_ns": start_time_ns,
+               "end_time_ns": end_time_ns,
+               "summary": json.dumps(self._summarize(demonstration))}
+        with self._connect() as connection:
+            connection.execute(f"INSERT OR REPLACE INTO demonstrations ({', '.join(row.keys())}) "
+                               f"VALUES ({', '.join(':' + key for key in row.keys())})", row)
+
+    def remove(self, file_path: str):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM demonstrations WHERE file_path = ?", (self._to_catalog_path(file_path),))
+
+    def index_directory(self, data_dir: str = DATA_DIR) -> int:
+        """Adds all new or modified demonstration files of a directory (recursively) and removes deleted ones.
+
+        Args:
+            data_dir (str, optional): directory containing the demonstrations. Defaults to DATA_DIR.
+
+        Returns:
+            int: number of added or updated demonstrations
+        """
+        with self._connect() as connection:
+            known = {row["file_path"]: (row["file_mtime_ns"], row["file_size"])
+                     for row in connection.execute("SELECT file_path, file_mtime_ns, file_size FROM demonstrations")}
+        updated = 0
+        for root, _, file_names in os.walk(data_dir):
+            for file_name in file_names:
+                if not (file_name.endswith(ROBOT_LOG_EXTENSION) or file_name.endswith(".pkl")):
+                    continue
+                file_path = os.path.join(root, file_name)
+                stat = os.stat(file_path)
+                if known.get(self._to_catalog_path(file_path)) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                try:
+                    self.add(file_path)
+                    updated += 1
+                except Exception as e:
+                    self.logger.warning(f"Failed to index {file_path}: {e}")
+        for file_path in known:
+            if not os.path.exists(self._from_catalog_path(file_path)):
+                self.remove(self._from_catalog_path(file_path))
+        return updated
+
+    def query(self,
+              robot: str = None,
+              log_info: str = None,
+              split: int = None,
+              min_duration: float = None,
+              max_duration: float = None,
+              start_after_ns: int = None,
+              start_before_ns: int = None,
+              limit: int = None) -> List[Dict]:
+        """Returns the catalog entries matching all given filters, ordered by recording time.
+
+        Args:
+            robot (str, optional): robot name, e.g. "Robot 0". Defaults to None.
+            log_info (str, optional): SQL LIKE pattern for the log information, e.g. "%Waage%". Defaults to None.
+            split (int, optional): split number. Defaults to None.
+            min_duration (float, optional): minimum duration in s. Defaults to None.
+            max_duration (float, optional): maximum duration in s. Defaults to None.
+            start_after_ns (int, optional): earliest start timestamp in ns. Defaults to None.
+            start_before_ns (int, optional): latest start timestamp in ns. Defaults to None.
+            limit (int, optional): maximum number of entries. Defaults to None.
+
+        Returns:
+            List[Dict]: catalog entries with absolute file paths and decoded summaries
+        """
+        conditions = []
+        parameters = []
+        for condition, value in [("robot = ?", robot),
+                                 ("log_info LIKE ?", log_info),
+                                 ("split = ?", split),
+                                 ("duration >= ?", min_duration),
+                                 ("duration <= ?", max_duration),
+                                 ("start_time_ns >= ?", start_after_ns),
+                                 ("start_time_ns <= ?", start_before_ns)]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        statement = "SELECT * FROM demonstrations"
+        if len(conditions) > 0:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += " ORDER BY start_time_ns, file_path"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+        with self._connect() as connection:
+            rows = [dict(row) for row in connection.execute(statement, parameters)]
+        for row in rows:
+            row["file_path"] = self._from_catalog_path(row["file_path"])
+            row["summary"] = json.loads(row["summary"])
+        return rows
+
+    def load_demonstrations(self, **filters) -> List[Demonstration]:
+        """Creates lazy handles for all demonstrations matching the filters of query()."""
+        return [Demonstration(row["file_path"]) for row in self.query(**filters)]
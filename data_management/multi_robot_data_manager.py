@@ -0,0 +1,201 @@
+from collections import deque
+from datetime import datetime
+import time
+from typing import Dict, List
+import threading
+
+import grpc
+import numpy as np
+from polymetis import RobotInterface
+from polymetis_pb2 import Empty
+from data_management.base_data_manager import BaseDataManager
+from data_management.demonstration_catalog import DEFAULT_CATALOG_PATH
+from data_management.robot_log import ROBOT_LOG_EXTENSION, TIMESTAMP_FIELD, RobotLogWriter
+from data_management.state_ring_buffer import RobotStateRingBuffer
+
+class MultiRobotDataManager(BaseDataManager):
+    def __init__(self, robots: List[RobotInterface], log_info:str = '', store_freq:float = None,
+                 sample_period_ns:int = 1_000_000, chunk_size:int = 1000, buffer_size:int = 10_000,
+                 robot_names:List[str] = None, catalog_path:str = DEFAULT_CATALOG_PATH):
+        """Data manager that records several robots into one time-aligned log.
+
+            Every robot stream is received by its own thread into a ring buffer (see RobotStateRingBuffer).
+            This thread resamples all robots block-wise onto a shared time grid
+            (joint fields are interpolated linearly, the remaining fields hold the previous sample)
+            and writes one log with the grid as "timestamp_ns" and the fields of each robot as "<robot name>/<field>".
+            The robot servers have to share a clock (e.g. run on the same machine).
+
+        Args:
+            robots (List[RobotInterface]):      Robot interfaces to log data from.
+            log_info (str, optional):           Information about the data to be logged. Defaults to ''.
+            store_freq (float, optional):       Frequency in Hz in which incomplete chunks are written to the log.
+                                                If None data is only written in full chunks and after "Stop" or "Split" event.
+                                                Defaults to None.
+            sample_period_ns (int, optional):   Period of the shared time grid in ns. Defaults to 1_000_000 (1 kHz).
+            chunk_size (int, optional):         Number of aligned samples written to the log at once. Defaults to 1000.
+            buffer_size (int, optional):        Maximum number of robot states per robot waiting to be aligned. Defaults to 10_000.
+            robot_names (List[str], optional):  Names used as field prefixes. Defaults to None ("robot_0", "robot_1", ...).
+            catalog_path (str, optional):       Demonstration catalog that is updated whenever a split is written.
+                                                Set to None to disable. Defaults to DEFAULT_CATALOG_PATH.
+        """
+        super().__init__(log_info, store_freq)
+        self.robots = robots
+        self.robot_names = robot_names or [f"robot_{idx}" for idx in range(len(robots))]
+        self.sample_period_ns = sample_period_ns
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.catalog_path = catalog_path
+        self.buffers: List[RobotStateRingBuffer] = [None] * len(robots) # created with the first received robot state
+
+    def _open_log(self, log_name: str) -> RobotLogWriter:
+        fields = [{"name": TIMESTAMP_FIELD, "dtype": "<i8", "shape": []}]
+        for robot_name, buffer in zip(self.robot_names, self.buffers):
+            fields += [{**field, "name": f"{robot_name}/{field['name']}"} for field in buffer.fields]
+        metadata = {"log_name": log_name,
+                    "log_info": self.log_info,
+                    "robots": self.robot_names,
+                    "sample_period_ns": self.sample_period_ns}
+        return RobotLogWriter(self._get_log_file_path(log_name, ROBOT_LOG_EXTENSION), fields, metadata)
+
+    def _close_log(self, writer: RobotLogWriter):
+        if writer is None:
+            return
+        writer.flush(sync=True)
+        writer.close()
+        for robot_name, buffer in zip(self.robot_names, self.buffers):
+            if buffer.dropped_samples > 0 or buffer.late_samples > 0:
+                self.logger.warning(f"{robot_name}: {buffer.dropped_samples} dropped and {buffer.late_samples} late robot states "
+                                    f"of {buffer.total_samples} since the start of logging.")
+        self._finalize_log(writer.file_path, self.catalog_path)
+
+    @staticmethod
+    def _align(pending: Dict[str, np.ndarray], grid: np.ndarray, prefix: str) -> Dict[str, np.ndarray]:
+        # pending covers the grid: pending[TIMESTAMP_FIELD][0] <= grid[0] and grid[-1] <= pending[TIMESTAMP_FIELD][-1]
+        timestamps = pending[TIMESTAMP_FIELD]
+        idx_prev = np.searchsorted(timestamps, grid, side='right') - 1
+        idx_next = np.minimum(idx_prev + 1, len(timestamps) - 1)
+        delta = timestamps[idx_next] - timestamps[idx_prev]
+        weight = np.divide(grid - timestamps[idx_prev], delta, out=np.zeros(len(grid)), where=delta > 0)
+        columns = dict()
+        for name, values in pending.items():
+            if values.dtype.kind == 'f':
+                prev_values = values[idx_prev]
+                weight_shape = (-1,) + (1,) * (values.ndim - 1)
+                columns[f"{prefix}/{name}"] = prev_values + weight.reshape(weight_shape) * (values[idx_next] - prev_values)
+            else:
+                columns[f"{prefix}/{name}"] = values[idx_prev]
+        return columns
+
+    def run(self):
+        start_time = datetime.now()
+
+        streams = [robot.grpc_connection.GetRobotStateStream(Empty()) for robot in self.robots]
+        split_cnt = 0
+        writer = None
+        store_delay = None if self.store_freq is None else 1/self.store_freq # in s
+        last_store_time = time.monotonic()
+        # timestamps at which a new split starts
+        split_markers = deque()
+        # received but not yet aligned samples per robot
+        pending: List[Dict[str, np.ndarray]] = [None] * len(self.robots)
+        # next time of the shared grid
+        next_grid_time = None
+        # aligned but not yet written samples
+        aligned: Dict[str, np.ndarray] = None
+
+        stop_update_event = threading.Event()
+        def _update_buffer(idx: int):
+            try:
+                for robot_state in streams[idx]:
+                    if stop_update_event.is_set():
+                        return
+                    if self.buffers[idx] is None:
+                        self.buffers[idx] = RobotStateRingBuffer(len(robot_state.joint_positions), self.buffer_size)
+                    if idx == 0 and self._split_event.is_set():
+                        # the new split starts with the timestamp of the first sample received after the split request
+                        self._split_event.clear()
+                        split_markers.append(robot_state.timestamp.seconds * 1_000_000_000 + robot_state.timestamp.nanos)
+                    self.buffers[idx].push(robot_state)
+            except grpc.RpcError as e:
+                if not stop_update_event.is_set():
+                    self.logger.error(f"Robot state stream of {self.robot_names[idx]} failed: {e}")
+
+        def _get_log_name() -> str:
+            return f"{start_time.strftime('%Y-%m-%d_%H-%M-%S')}_{self.log_info}_SPLIT_{split_cnt}"
+
+        def _align_pending():
+            nonlocal next_grid_time, aligned
+            for idx, buffer in enumerate(self.buffers):
+                if buffer is None or len(buffer) == 0:
+                    continue
+                new_samples = buffer.drain()
+                if pending[idx] is None:
+                    pending[idx] = new_samples
+                else:
+                    pending[idx] = {name: np.concatenate((pending[idx][name], new_samples[name])) for name in new_samples}
+            if any(samples is None for samples in pending):
+                return
+            if next_grid_time is None:
+                # the grid starts as soon as all robots deliver data
+                first_time = max(int(samples[TIMESTAMP_FIELD][0]) for samples in pending)
+                next_grid_time = -(-first_time // self.sample_period_ns) * self.sample_period_ns
+            horizon = min(int(samples[TIMESTAMP_FIELD][-1]) for samples in pending)
+            if horizon < next_grid_time:
+                return
+            grid = np.arange(next_grid_time, horizon + 1, self.sample_period_ns, dtype=np.int64)
+            columns = {TIMESTAMP_FIELD: grid}
+            for idx, robot_name in enumerate(self.robot_names):
+                columns.update(self._align(pending[idx], grid, robot_name))
+                # keep the last sample before the next grid time for the interpolation of the next block
+                keep_from = max(int(np.searchsorted(pending[idx][TIMESTAMP_FIELD], grid[-1], side='right')) - 1, 0)
+                pending[idx] = {name: values[keep_from:] for name, values in pending[idx].items()}
+            next_grid_time = int(grid[-1]) + self.sample_period_ns
+            if aligned is None:
+                aligned = columns
+            else:
+                aligned = {name: np.concatenate((aligned[name], columns[name])) for name in columns}
+
+        def _write_aligned(min_samples: int):
+            nonlocal writer, split_cnt, aligned
+            while aligned is not None and len(aligned[TIMESTAMP_FIELD]) > 0:
+                num_samples = len(aligned[TIMESTAMP_FIELD])
+                if len(split_markers) > 0:
+                    split_idx = int(np.searchsorted(aligned[TIMESTAMP_FIELD], split_markers[0], side='left'))
+                    if split_idx == 0:
+                        self._close_log(writer)
+                        writer = None
+                        split_cnt += 1
+                        split_markers.popleft()
+                        continue
+                    num_samples = split_idx
+                if num_samples == len(aligned[TIMESTAMP_FIELD]) and num_samples < max(min_samples, 1):
+                    return
+                num_samples = min(num_samples, self.chunk_size)
+                if writer is None:
+                    writer = self._open_log(_get_log_name())
+                writer.append({name: values[:num_samples] for name, values in aligned.items()})
+                writer.flush()
+                aligned = {name: values[num_samples:] for name, values in aligned.items()}
+
+        update_threats = [threading.Thread(target=_update_buffer, args=(idx,), daemon=True) for idx in range(len(self.robots))]
+        for update_threat in update_threats:
+            update_threat.start()
+
+        while not self._stop_event.is_set():
+            _align_pending()
+            _write_aligned(self.chunk_size)
+            if store_delay is not None and time.monotonic() - last_store_time >= store_delay:
+                _write_aligned(1)
+                last_store_time = time.monotonic()
+            time.sleep(0.01)
+
+        self._stop_event.clear()
+        stop_update_event.set()
+        for stream in streams:
+            stream.cancel()
+        for update_threat in update_threats:
+            update_threat.join()
+        _align_pending()
+        _write_aligned(1)
+        self._close_log(writer)
+        self.logger.debug("Stopped.")
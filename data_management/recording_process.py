@@ -0,0 +1,103 @@
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import List, Tuple
+
+from polymetis import RobotInterface
+
+from data_management.multi_robot_data_manager import MultiRobotDataManager
+from data_management.robot_data_manager import RobotDataManager
+
+_SPLIT = "split"
+_STOP = "stop"
+_ERROR = "error"
+_STOPPED = "stopped"
+
+def _record(connection: Connection, robot_addresses: List[Tuple[str, int]], log_info: str, time_aligned: bool, data_manager_kwargs: dict):
+    # executed in the recording process, connects to the robots itself so no data passes through the parent process
+    try:
+        robots = [RobotInterface(ip_address=ip_address, port=port) for ip_address, port in robot_addresses]
+        if time_aligned:
+            data_manager = MultiRobotDataManager(robots, log_info=log_info, **data_manager_kwargs)
+        else:
+            data_manager = RobotDataManager(robots[0], log_info=log_info, **data_manager_kwargs)
+        data_manager.start()
+    except Exception as e:
+        connection.send((_ERROR, f"Failed to start recording: {e}"))
+        connection.close()
+        return
+    while True:
+        command = connection.recv()
+        if command == _SPLIT:
+            data_manager.split()
+        elif command == _STOP:
+            data_manager.stop()
+            data_manager.join()
+            connection.send((_STOPPED, None))
+            connection.close()
+            return
+
+class RecordingProcess:
+    def __init__(self,
+                 robot_addresses: List[Tuple[str, int]],
+                 log_info: str = '',
+                 time_aligned: bool = False,
+                 **data_manager_kwargs):
+        """Runs a RobotDataManager (or a MultiRobotDataManager) in its own process,
+        so recording does not compete with the tasks for the GIL of the GUI process.
+
+            The process opens its own connections to the robot servers and writes the logs directly.
+            It is controlled with start/split/stop like a data manager thread; commands are sent over a pipe.
+
+        Args:
+            robot_addresses (List[Tuple[str, int]]):    (ip address, port) of the robot servers.
+                                                        Only the first one is used unless time_aligned is set.
+            log_info (str, optional):                   Information about the data to be logged. Defaults to ''.
+            time_aligned (bool, optional):              record all robots into one time-aligned log. Defaults to False.
+            **data_manager_kwargs:                      further arguments of the data manager (e.g. store_freq)
+        """
+        self.logger = logging.getLogger(__name__)
+        self._connection, self._child_connection = multiprocessing.Pipe()
+        # spawn instead of fork, the GUI process runs gRPC and Tk threads
+        context = multiprocessing.get_context("spawn")
+        self._process = context.Process(target=_record,
+                                        args=(self._child_connection, robot_addresses, log_info, time_aligned, data_manager_kwargs),
+                                        daemon=True)
+
+    def _receive(self, timeout: float = 0.0):
+        while self._connection.poll(timeout):
+            try:
+                message, content = self._connection.recv()
+            except EOFError:
+                return
+            if message == _ERROR:
+                self.logger.error(content)
+            elif message == _STOPPED:
+                return
+
+    def _send(self, command: str):
+        self._receive()
+        try:
+            self._connection.send(command)
+        except (BrokenPipeError, OSError):
+            self.logger.error("Recording process is not running.")
+
+    def start(self):
+        self._process.start()
+        # only the recording process uses this end, closing it here lets recv() notice if the process dies
+        self._child_connection.close()
+
+    def split(self):
+        self._send(_SPLIT)
+
+    def stop(self):
+        self._send(_STOP)
+
+    def join(self, timeout: float = None):
+        if self._process.is_alive():
+            self._receive(timeout)
+        self._process.join(timeout)
+        self._connection.close()
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
@@ -1,90 +1,162 @@
+from collections import deque
 from datetime import datetime
 import time
-from typing import List
+from typing import Dict
 import threading
-from queue import Queue
-import pickle
 
+import grpc
+import numpy as np
 from polymetis import RobotInterface
 from polymetis_pb2 import Empty
 from data_management.base_data_manager import BaseDataManager
+from data_management.decimation import Decimator
+from data_management.demonstration_catalog import DEFAULT_CATALOG_PATH
+from data_management.robot_log import ROBOT_LOG_EXTENSION, TIMESTAMP_FIELD, RobotLogWriter, robot_state_fields
+from data_management.state_ring_buffer import RobotStateRingBuffer
 
 class RobotDataManager(BaseDataManager):
-    def __init__(self, robot: RobotInterface, log_info:str = '', store_freq:float = None, downsamling_ratio:int = 1):
+    def __init__(self, robot: RobotInterface, log_info:str = '', store_freq:float = None, downsamling_ratio:int = 1,
+                 field_downsampling_ratios:Dict[str, int] = None, chunk_size:int = 1000, buffer_size:int = 10_000,
+                 catalog_path:str = DEFAULT_CATALOG_PATH):
         """Data manager for robot data.
 
+            Incoming robot states are copied into a preallocated ring buffer (see RobotStateRingBuffer)
+            by a single stream thread that runs until "Stop". A "Split" marks the first sample received afterwards
+            as the start of the new split, so no samples are lost or mixed up at the boundary.
+            This thread drains the buffer in chunks of chunk_size samples and appends them to the log file of the current split,
+            so the memory usage is bounded and a crash only loses the samples that are not written yet.
+            Downsampled fields are low-pass filtered before they are stored (see Decimator),
+            the timestamps are stored at the highest rate of all fields.
+
         Args:
-            robot (RobotInterface):         Robot interface to log data from.
-            log_info (str, optional):       Information about the data to be logged. Defaults to ''.
-            store_freq (float, optional):   Frequency in Hz in which to write the data to the log. 
-                                            All data will always be logged. 
-                                            Executes only after "Stop" or "Split" event if None. 
-                                            Recommended to keep frequency low to avoid performance issues.
-                                            Defaults to None.
+            robot (RobotInterface):             Robot interface to log data from.
+            log_info (str, optional):           Information about the data to be logged. Defaults to ''.
+            store_freq (float, optional):       Frequency in Hz in which incomplete chunks are written to the log.
+                                                All data will always be logged.
+                                                If None data is only written in full chunks and after "Stop" or "Split" event.
+                                                Defaults to None.
+            downsamling_ratio (int, optional):  Fields are stored at 1/n of the robot state rate. Defaults to 1.
+            field_downsampling_ratios (Dict[str, int], optional):
+                                                Ratios of individual fields that differ from downsamling_ratio,
+                                                e.g. {"joint_torques_computed": 4} for 250 Hz at a 1 kHz stream.
+                                                All ratios have to be multiples of the smallest one. Defaults to None.
+            chunk_size (int, optional):         Number of robot states written to the log at once. Defaults to 1000.
+            buffer_size (int, optional):        Maximum number of robot states waiting to be written.
+                                                New robot states are dropped (and counted) if exceeded. Defaults to 10_000.
+            catalog_path (str, optional):       Demonstration catalog that is updated whenever a split is written.
+                                                Set to None to disable. Defaults to DEFAULT_CATALOG_PATH.
         """
         super().__init__(log_info, store_freq)
         self.robot = robot
         self.downsampling_ratio = downsamling_ratio
+        self.field_downsampling_ratios = field_downsampling_ratios or dict()
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.buffer: RobotStateRingBuffer = None # created with the first received robot state
+        self.decimator: Decimator = None # created with the first written chunk
+        self.catalog_path = catalog_path
+
+    def _create_decimator(self, num_dof: int) -> Decimator:
+        fields = robot_state_fields(num_dof)
+        ratios = {field["name"]: self.field_downsampling_ratios.get(field["name"], self.downsampling_ratio)
+                  for field in fields if field["name"] != TIMESTAMP_FIELD}
+        return Decimator(fields, ratios, TIMESTAMP_FIELD)
+
+    def _open_log(self, log_name: str) -> RobotLogWriter:
+        log_file_path = self._get_log_file_path(log_name, ROBOT_LOG_EXTENSION)
+        metadata = {"log_name": log_name,
+                    "log_info": self.log_info,
+                    "downsampling_ratio": self.decimator.ratios[TIMESTAMP_FIELD],
+                    "field_downsampling_ratios": self.decimator.ratios}
+        return RobotLogWriter(log_file_path, self.decimator.fields, metadata)
+
+    def _append_chunk(self, writer: RobotLogWriter, log_name: str, chunk: Dict[str, np.ndarray]) -> RobotLogWriter:
+        if self.decimator is None:
+            self.decimator = self._create_decimator(self.buffer.num_dof)
+        if writer is None:
+            writer = self._open_log(log_name)
+        writer.append(self.decimator.process(chunk))
+        writer.flush()
+        return writer
+
+    def _close_log(self, writer: RobotLogWriter):
+        if writer is None:
+            return
+        # the filters still hold the last samples of the split
+        writer.append(self.decimator.finish())
+        writer.flush(sync=True)
+        writer.close()
+        if self.buffer.dropped_samples > 0 or self.buffer.late_samples > 0:
+            self.logger.warning(f"{self.buffer.dropped_samples} dropped and {self.buffer.late_samples} late robot states "
+                                f"of {self.buffer.total_samples} since the start of logging.")
+        self._finalize_log(writer.file_path, self.catalog_path)
 
     def run(self):
         start_time = datetime.now()
 
         stream = self.robot.grpc_connection.GetRobotStateStream(Empty())
         split_cnt = 0
-        current_split = Queue()
-
-        last_store_time = datetime.now()
+        writer = None
+        store_delay = None if self.store_freq is None else 1/self.store_freq # in s
+        last_store_time = time.monotonic()
+        # buffer sample numbers at which a new split starts
+        split_markers = deque()
 
         stop_update_event = threading.Event()
-        def _update_queue():
-            step = 0
-            while True:
+        def _update_buffer():
+            try:
                 for robot_state in stream:
-                    if not stop_update_event.is_set():
-                        step += 1
-                        if step % self.downsampling_ratio == 0:
-                            current_split.put(robot_state)
-                    else:
-                        stop_update_event.clear()
+                    if stop_update_event.is_set():
                         return
+                    if self.buffer is None:
+                        self.buffer = RobotStateRingBuffer(len(robot_state.joint_positions), self.buffer_size)
+                    if self._split_event.is_set():
+                        # the new split starts exactly with the first sample received after the split request
+                        self._split_event.clear()
+                        split_markers.append(self.buffer.total_samples)
+                    self.buffer.push(robot_state)
+            except grpc.RpcError as e:
+                if not stop_update_event.is_set():
+                    self.logger.error(f"Robot state stream failed: {e}")
+
+        def _get_log_name() -> str:
+            return f"{start_time.strftime('%Y-%m-%d_%H-%M-%S')}_{self.log_info}_SPLIT_{split_cnt}"
 
-        update_threat = threading.Thread(target=_update_queue, args=(), daemon=True)
+        def _write_buffer(min_samples: int):
+            nonlocal writer, split_cnt
+            while self.buffer is not None:
+                # never drain more than available, a split marker is added before its sample is pushed,
+                # so a marker that is not visible yet is at or after drained_samples + available.
+                available = len(self.buffer)
+                if len(split_markers) > 0:
+                    remaining = split_markers[0] - self.buffer.drained_samples
+                    if remaining <= 0:
+                        self._close_log(writer)
+                        writer = None
+                        split_cnt += 1
+                        split_markers.popleft()
+                        continue
+                    if available >= remaining:
+                        writer = self._append_chunk(writer, _get_log_name(), self.buffer.drain(min(remaining, self.chunk_size)))
+                        continue
+                if available < max(min_samples, 1):
+                    return
+                writer = self._append_chunk(writer, _get_log_name(), self.buffer.drain(min(available, self.chunk_size)))
+
+        update_threat = threading.Thread(target=_update_buffer, args=(), daemon=True)
         update_threat.start()
 
         while not self._stop_event.is_set():
-            log_delay = None if self.store_freq is None else 1/self.store_freq * 1000 # in ms
-            if self._split_event.is_set():
-                self._split_event.clear()
-                stop_update_event.set()
-                update_threat.join()
-                log_name = f"{start_time.strftime('%Y-%m-%d_%H-%M-%S')}_{self.log_info}_SPLIT_{split_cnt}"
-                store_data = list()
-                while not current_split.empty():
-                    store_data.append(current_split.get())
-                self._store_data(store_data, log_name)
-                split_cnt += 1
-                current_split = Queue()
-                update_threat = threading.Thread(target=_update_queue, args=(), daemon=True)
-                update_threat.start()
-
-            if log_delay is not None:
-                store_data = list()
-                if (datetime.now() - last_store_time).microseconds >= log_delay:
-                    last_store_time = datetime.now()
-                    new_data = list()
-                    while not current_split.empty():
-                        new_data.append(current_split.get())
-                    store_data += new_data
-                    log_name = f"{start_time.strftime('%Y-%m-%d_%H-%M-%S')}_{self.log_info}_SPLIT_{split_cnt}"
-                    self._store_data(store_data, log_name)
-            time.sleep(0.1)
-    
+            _write_buffer(self.chunk_size)
+            if store_delay is not None and time.monotonic() - last_store_time >= store_delay:
+                _write_buffer(1)
+                last_store_time = time.monotonic()
+            time.sleep(0.01)
+
         self._stop_event.clear()
         stop_update_event.set()
+        stream.cancel()
         update_threat.join()
-        log_name = f"{start_time.strftime('%Y-%m-%d_%H-%M-%S')}_{self.log_info}_SPLIT_{split_cnt}"
-        store_data = list()
-        while not current_split.empty():
-            store_data.append(current_split.get())
-        self._store_data(store_data, log_name)
+        _write_buffer(1)
+        self._close_log(writer)
         self.logger.debug("Stopped.")
@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import struct
+from typing import Dict, List, Sequence
+
+import numpy as np
+from polymetis_pb2 import RobotState
+
+ROBOT_LOG_EXTENSION = ".famlog"
+
+_MAGIC = b"FAMLOG\x00\x01"
+_CHUNK_MAGIC = b"CHNK"
+_ALIGNMENT = 8
+_FORMAT_VERSION = 2 # 2: optional "time_stride" of the fields
+
+# per-joint fields of polymetis_pb2.RobotState (stored as float32 like in the protobuf)
+JOINT_FIELDS = [
+    "joint_positions",
+    "joint_velocities",
+    "joint_torques_computed",
+    "prev_joint_torques_computed",
+    "prev_joint_torques_computed_safened",
+    "motor_torques_measured",
+    "motor_torques_external",
+    "motor_torques_desired",
+]
+# scalar fields of polymetis_pb2.RobotState
+SCALAR_FIELDS = {
+    "prev_controller_latency_ms": "<f4",
+    "prev_command_successful": "|b1",
+    "error_code": "<i4",
+}
+TIMESTAMP_FIELD = "timestamp_ns"
+
+logger = logging.getLogger(__name__)
+
+def _padding(size: int) -> int:
+    return (-size) % _ALIGNMENT
+
+def robot_state_fields(num_dof: int) -> List[Dict]:
+    """Field description of a robot log containing polymetis RobotStates.
+
+    Args:
+        num_dof (int): number of joints of the robot
+
+    Returns:
+        List[Dict]: field descriptions (name, dtype, shape) in storage order
+    """
+    fields = [{"name": TIMESTAMP_FIELD, "dtype": "<i8", "shape": []}]
+    fields += [{"name": name, "dtype": "<f4", "shape": [num_dof]} for name in JOINT_FIELDS]
+    fields += [{"name": name, "dtype": dtype, "shape": []} for name, dtype in SCALAR_FIELDS.items()]
+    return fields
+
+def robot_states_to_columns(robot_states: Sequence[RobotState]) -> Dict[str, np.ndarray]:
+    """Converts a sequence of RobotStates into one contiguous array per field.
+
+    Args:
+        robot_states (Sequence[RobotState]): states to convert
+
+    Returns:
+        Dict[str, np.ndarray]: arrays with the number of states as first dimension
+    """
+    n = len(robot_states)
+    num_dof = len(robot_states[0].joint_positions) if n > 0 else 0
+    columns = dict()
+    columns[TIMESTAMP_FIELD] = np.fromiter(
+        (s.timestamp.seconds * 1_000_000_000 + s.timestamp.nanos for s in robot_states), dtype=np.int64, count=n)
+    for name in JOINT_FIELDS:
+        columns[name] = np.array([getattr(s, name) for s in robot_states], dtype=np.float32).reshape(n, num_dof)
+    for name, dtype in SCALAR_FIELDS.items():
+        columns[name] = np.fromiter((getattr(s, name) for s in robot_states), dtype=np.dtype(dtype), count=n)
+    return columns
+
+class RobotLogWriter:
+    def __init__(self, file_path: str, fields: List[Dict], metadata: Dict = None):
+        """Writes a columnar robot log.
+
+            The file consists of a small JSON header followed by chunks.
+            Every chunk stores one contiguous array per field, so a log written as a single chunk
+            can be memory-mapped field by field (see RobotLog).
+
+        Args:
+            file_path (str):            path of the log file (should end with ROBOT_LOG_EXTENSION)
+            fields (List[Dict]):        field descriptions (name, dtype, shape), e.g. robot_state_fields(7)
+            metadata (Dict, optional):  JSON serializable information stored in the header. Defaults to None.
+        """
+        self.file_path = file_path
+        self.fields = fields
+        self.num_samples = 0
+        header = json.dumps({"version": _FORMAT_VERSION,
+                             "fields": fields,
+                             "metadata": metadata or dict()}).encode("utf-8")
+        header += b" " * _padding(len(_MAGIC) + 4 + len(header))
+        self._file = open(file_path, "wb")
+        self._file.write(_MAGIC)
+        self._file.write(struct.pack("<I", len(header)))
+        self._file.write(header)
+
+    def append(self, columns: Dict[str, np.ndarray]):
+        """Appends a chunk to the log.
+
+        Args:
+            columns (Dict[str, np.ndarray]): one array per field with the samples as first dimension
+        """
+        self._write_chunk([[columns[field["name"]]] for field in self.fields])
+
+    def _write_chunk(self, field_parts: List[List[np.ndarray]]):
+        field_parts = [[np.ascontiguousarray(part, dtype=np.dtype(field["dtype"])) for part in parts]
+                       for field, parts in zip(self.fields, field_parts)]
+        counts = [sum(len(part) for part in parts) for parts in field_parts]
+        if max(counts) == 0:
+            return
+        chunk_header = _CHUNK_MAGIC + struct.pack(f"<{len(counts)}I", *counts)
+        chunk_header += b"\x00" * _padding(len(chunk_header))
+        self._file.write(chunk_header)
+        for parts in field_parts:
+            size = 0
+            for part in parts:
+                self._file.write(part.tobytes())
+                size += part.nbytes
+            self._file.write(b"\x00" * _padding(size))
+        self.num_samples += counts[0]
+
+    def flush(self, sync: bool = False):
+        """Flushes written chunks to the operating system.
+
+        Args:
+            sync (bool, optional): additionally force the data onto the disk. Defaults to False.
+        """
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def write_robot_states(cls, file_path: str, robot_states: Sequence[RobotState], metadata: Dict = None):
+        """Writes a complete list of RobotStates as a single chunk log.
+
+        Args:
+            file_path (str):                    path of the log file
+            robot_states (Sequence[RobotState]): states to store
+            metadata (Dict, optional):          JSON serializable information stored in the header. Defaults to None.
+        """
+        num_dof = len(robot_states[0].joint_positions) if len(robot_states) > 0 else 0
+        with cls(file_path, robot_state_fields(num_dof), metadata) as writer:
+            writer.append(robot_states_to_columns(robot_states))
+
+class RobotLog:
+    def __init__(self, file_path: str):
+        """Read access to a columnar robot log written by RobotLogWriter.
+
+            Fields are returned as numpy arrays. If the log consists of a single chunk
+            the arrays are copy-on-write memory maps of the file, i.e. only the touched fields are read.
+            A trailing incomplete chunk (e.g. after a crash) is ignored.
+
+        Args:
+            file_path (str): path of the log file
+        """
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{file_path} is not a robot log.")
+            header_size, = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_size).decode("utf-8"))
+            self.version = header["version"]
+            if self.version > _FORMAT_VERSION:
+                raise ValueError(f"{file_path} has the unsupported format version {self.version}.")
+            self.fields = header["fields"]
+            self.metadata = header["metadata"]
+            self._chunks = self._index_chunks(f, os.fstat(f.fileno()).st_size)
+
+    def _index_chunks(self, f, file_size: int) -> List[List[tuple]]:
+        chunk_header_size = len(_CHUNK_MAGIC) + 4 * len(self.fields)
+        chunk_header_size += _padding(chunk_header_size)
+        chunks = []
+        offset = f.tell()
+        while offset + chunk_header_size <= file_size:
+            f.seek(offset)
+            chunk_header = f.read(chunk_header_size)
+            if chunk_header[:len(_CHUNK_MAGIC)] != _CHUNK_MAGIC:
+                break
+            counts = struct.unpack(f"<{len(self.fields)}I", chunk_header[len(_CHUNK_MAGIC):len(_CHUNK_MAGIC) + 4 * len(self.fields)])
+            offset += chunk_header_size
+            blocks = []
+            for field, count in zip(self.fields, counts):
+                size = count * self._sample_size(field)
+                blocks.append((offset, count))
+                offset += size + _padding(size)
+            if offset - _padding(size) > file_size:
+                logger.warning(f"Ignoring incomplete chunk at the end of {self.file_path}.")
+                break
+            chunks.append(blocks)
+        return chunks
+
+    @staticmethod
+    def _sample_size(field: Dict) -> int:
+        return np.dtype(field["dtype"]).itemsize * int(np.prod(field["shape"], dtype=np.int64))
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self._chunks)
+
+    def _field_parts(self, idx: int) -> List[np.ndarray]:
+        field = self.fields[idx]
+        dtype = np.dtype(field["dtype"])
+        return [np.memmap(self.file_path, dtype=dtype, mode="c", offset=offset, shape=(count, *field["shape"]))
+                for offset, count in (blocks[idx] for blocks in self._chunks) if count > 0]
+
+    @property
+    def field_names(self) -> List[str]:
+        return [field["name"] for field in self.fields]
+
+    def __len__(self) -> int:
+        return self.num_samples(self.fields[0]["name"]) if len(self.fields) > 0 else 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.field_names
+
+    def num_samples(self, name: str) -> int:
+        idx = self.field_names.index(name)
+        return sum(blocks[idx][1] for blocks in self._chunks)
+
+    def time_stride(self, name: str) -> int:
+        """Number of samples of the time field per sample of a field.
+        Sample k of a field belongs to sample k * time_stride of the time field (see Decimator).
+
+        Args:
+            name (str): name of the field
+
+        Returns:
+            int: time stride of the field (1 if the field is stored at the rate of the timestamps)
+        """
+        return self.fields[self.field_names.index(name)].get("time_stride", 1)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Returns all samples of a field.
+
+        Args:
+            name (str): name of the field
+
+        Returns:
+            np.ndarray: samples of the field with shape [num_samples, *field_shape]
+        """
+        if name not in self.field_names:
+            raise KeyError(name)
+        idx = self.field_names.index(name)
+        field = self.fields[idx]
+        parts = self._field_parts(idx)
+        if len(parts) == 0:
+            return np.empty((0, *field["shape"]), dtype=np.dtype(field["dtype"]))
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def to_robot_states(self) -> List[RobotState]:
+        """Converts the log back into a list of polymetis RobotStates.
+        Only use this for legacy code, the field arrays are much cheaper to work with.
+
+        Returns:
+            List[RobotState]: the logged robot states
+        """
+        columns = {name: self[name] for name in self.field_names}
+        robot_states = []
+        for i in range(len(self)):
+            robot_state = RobotState()
+            seconds, nanos = divmod(int(columns[TIMESTAMP_FIELD][i]), 1_000_000_000)
+            robot_state.timestamp.seconds = seconds
+            robot_state.timestamp.nanos = nanos
+            for name in JOINT_FIELDS:
+                getattr(robot_state, name).extend(columns[name][i].tolist())
+            for name in SCALAR_FIELDS:
+                setattr(robot_state, name, columns[name][i].item())
+            robot_states.append(robot_state)
+        return robot_states
+
+def compact_robot_log(file_path: str):
+    """Rewrites a log consisting of multiple chunks (e.g. written while streaming) as a single chunk,
+    so that every field becomes one contiguous array. Incomplete trailing chunks are dropped.
+    The data is copied chunk by chunk, i.e. memory usage does not depend on the size of the log.
+
+    Args:
+        file_path (str): path of the log file
+    """
+    log = RobotLog(file_path)
+    if log.num_chunks <= 1:
+        return
+    tmp_file_path = f"{file_path}.tmp"
+    with RobotLogWriter(tmp_file_path, log.fields, log.metadata) as writer:
+        writer._write_chunk([log._field_parts(idx) for idx in range(len(log.fields))])
+        writer.flush(sync=True)
+    os.replace(tmp_file_path, file_path)
@@ -0,0 +1,92 @@
+from typing import Dict
+
+import numpy as np
+from polymetis_pb2 import RobotState
+
+from data_management.robot_log import JOINT_FIELDS, SCALAR_FIELDS, TIMESTAMP_FIELD, robot_state_fields
+
+class RobotStateRingBuffer:
+    def __init__(self, num_dof: int, capacity: int = 10_000, late_threshold_ns: int = 2_000_000):
+        """Preallocated ring buffer for a stream of robot states.
+
+            The numeric fields of every pushed state are copied straight into typed arrays,
+            no objects are kept. It is lock-free for a single producer (push) and a single consumer (drain):
+            each side only advances its own counter and the producer publishes a sample after it is written.
+
+        Args:
+            num_dof (int): number of joints of the robot
+            capacity (int, optional): maximum number of buffered samples. Defaults to 10_000.
+            late_threshold_ns (int, optional): a sample counts as late if its timestamp is more than this
+                                               after the previous one. Defaults to 2_000_000 (2 ms).
+        """
+        self.num_dof = num_dof
+        self.capacity = capacity
+        self.late_threshold_ns = late_threshold_ns
+        self.fields = robot_state_fields(num_dof)
+        self._buffers = {field["name"]: np.zeros((capacity, *field["shape"]), dtype=np.dtype(field["dtype"]))
+                         for field in self.fields}
+        self._write_count = 0 # only modified by the producer
+        self._read_count = 0 # only modified by the consumer
+        self._last_timestamp_ns = None
+        self.dropped_samples = 0
+        self.late_samples = 0
+
+    def __len__(self) -> int:
+        return self._write_count - self._read_count
+
+    @property
+    def total_samples(self) -> int:
+        """number of samples pushed since the creation of the buffer"""
+        return self._write_count
+
+    @property
+    def drained_samples(self) -> int:
+        """number of samples drained since the creation of the buffer"""
+        return self._read_count
+
+    def push(self, robot_state: RobotState) -> bool:
+        """Copies a robot state into the buffer. The state is dropped if the buffer is full.
+
+        Args:
+            robot_state (RobotState): state to add
+
+        Returns:
+            bool: False if the state was dropped
+        """
+        timestamp_ns = robot_state.timestamp.seconds * 1_000_000_000 + robot_state.timestamp.nanos
+        if self._last_timestamp_ns is not None and timestamp_ns - self._last_timestamp_ns > self.late_threshold_ns:
+            self.late_samples += 1
+        self._last_timestamp_ns = timestamp_ns
+        if self._write_count - self._read_count >= self.capacity:
+            self.dropped_samples += 1
+            return False
+        idx = self._write_count % self.capacity
+        self._buffers[TIMESTAMP_FIELD][idx] = timestamp_ns
+        for name in JOINT_FIELDS:
+            self._buffers[name][idx] = getattr(robot_state, name)
+        for name in SCALAR_FIELDS:
+            self._buffers[name][idx] = getattr(robot_state, name)
+        self._write_count += 1
+        return True
+
+    def drain(self, max_samples: int = None) -> Dict[str, np.ndarray]:
+        """Removes the oldest samples from the buffer.
+
+        Args:
+            max_samples (int, optional): maximum number of samples to remove. Defaults to None (all).
+
+        Returns:
+            Dict[str, np.ndarray]: one array per field with the samples as first dimension
+        """
+        num_samples = len(self)
+        if max_samples is not None:
+            num_samples = min(num_samples, max_samples)
+        start = self._read_count % self.capacity
+        stop = start + num_samples
+        if stop <= self.capacity:
+            columns = {name: buffer[start:stop].copy() for name, buffer in self._buffers.items()}
+        else:
+            stop -= self.capacity
+            columns = {name: np.concatenate((buffer[start:], buffer[:stop])) for name, buffer in self._buffers.items()}
+        self._read_count += num_samples
+        return columns
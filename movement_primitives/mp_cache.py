@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Dict
+
+import numpy as np
+import torch
+from mp_pytorch.mp import MPFactory
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 "data_management", "cache", "mp_fits")
+
+# arguments of MPFactory.init_mp used by the replay tasks (tau is set to the duration of the demonstration)
+DEFAULT_MP_CONFIG = {"mp_type": "prodmp",
+                     "num_dof": 7,
+                     "mp_args": {"num_basis": 10,
+                                 "basis_bandwidth_factor": 2,
+                                 "num_basis_outside": 0,
+                                 "alpha": 25,
+                                 "alpha_phase": 2,
+                                 "dt": 0.01}}
+
+def fit_mp(times: torch.Tensor, trajectory: torch.Tensor, mp_config: Dict = DEFAULT_MP_CONFIG) -> Dict:
+    """Fits a movement primitive to a trajectory (or a batch of trajectories).
+
+    Args:
+        times (torch.Tensor): time points of the trajectory with shape [*batch, num_times]
+        trajectory (torch.Tensor): trajectory with shape [*batch, num_times, num_dof]
+        mp_config (Dict, optional): keyword arguments of MPFactory.init_mp. Defaults to DEFAULT_MP_CONFIG.
+
+    Returns:
+        Dict: "params" (learned parameters, see learn_mp_params_from_trajs) and
+              "pos" (trajectory reproduced by the movement primitive at times)
+    """
+    mp = MPFactory.init_mp(**mp_config)
+    params = mp.learn_mp_params_from_trajs(times, trajectory)
+    return {"params": params, "pos": mp.get_trajs(get_pos=True, get_vel=False)["pos"]}
+
+class MPFitCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = 256):
+        """On-disk cache of fitted movement primitive parameters.
+
+            Entries are keyed by the content of the fitted trajectory (times and values)
+            and the MP configuration, so a demonstration is only fitted once per configuration.
+            The least recently used entries are removed when there are more than max_entries.
+
+        Args:
+            cache_dir (str, optional): directory of the cache entries. Defaults to DEFAULT_CACHE_DIR.
+            max_entries (int, optional): maximum number of cached fits. Defaults to 256.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    @staticmethod
+    def get_key(times: torch.Tensor, trajectory: torch.Tensor, mp_config: Dict) -> str:
+        key = hashlib.sha1()
+        for values in (times, trajectory):
+            values = np.ascontiguousarray(values.detach().cpu().numpy())
+            key.update(f"{values.dtype.str}{values.shape}".encode("utf-8"))
+            key.update(values.tobytes())
+        key.update(json.dumps(mp_config, sort_keys=True, default=str).encode("utf-8"))
+        return key.hexdigest()
+
+    def _get_cache_file_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def load(self, key: str) -> Dict:
+        """Returns a cached fit (see fit) or None."""
+        cache_file_path = self._get_cache_file_path(key)
+        try:
+            params = torch.load(cache_file_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Ignoring broken cache entry {cache_file_path}: {e}")
+            return None
+        # the modification time marks the last use for the eviction
+        os.utime(cache_file_path)
+        return params
+
+    def store(self, key: str, fit: Dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file_path = self._get_cache_file_path(key)
+        tmp_file_path = f"{cache_file_path}.{os.getpid()}.tmp"
+        torch.save({"params": {name: torch.as_tensor(value).detach().cpu() for name, value in fit["params"].items()},
+                    "pos": fit["pos"].detach().cpu()}, tmp_file_path)
+        os.replace(tmp_file_path, cache_file_path)
+        self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".pt")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def fit(self, times: torch.Tensor, trajectory: torch.Tensor, mp_config: Dict = DEFAULT_MP_CONFIG) -> Dict:
+        """Fits a movement primitive to a trajectory, the fit is only computed if it is not cached.
+
+            Besides the parameters the reproduced trajectory is cached, so a cache hit does not
+            even have to create the movement primitive (initializing the basis is the most expensive part).
+
+        Args:
+            times (torch.Tensor): time points of the trajectory with shape [*batch, num_times]
+            trajectory (torch.Tensor): trajectory with shape [*batch, num_times, num_dof]
+            mp_config (Dict, optional): keyword arguments of MPFactory.init_mp. Defaults to DEFAULT_MP_CONFIG.
+
+        Returns:
+            Dict: see fit_mp
+        """
+        key = self.get_key(times, trajectory, mp_config)
+        fit = self.load(key)
+        if fit is None:
+            fit = fit_mp(times, trajectory, mp_config)
+            self.store(key, fit)
+        return fit
+
+    def clear(self):
+        """Removes all cache entries."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
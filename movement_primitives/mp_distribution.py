@@ -0,0 +1,120 @@
+from typing import Dict, List
+
+import torch
+
+from movement_primitives.mp_cache import DEFAULT_MP_CONFIG, MPFitCache, fit_mp
+
+def interpolate(times: torch.Tensor, values: torch.Tensor, new_times: torch.Tensor) -> torch.Tensor:
+    """Linear interpolation of a trajectory (values outside of times are clamped).
+
+    Args:
+        times (torch.Tensor): increasing time points with shape [num_times]
+        values (torch.Tensor): trajectory with shape [num_times, ...]
+        new_times (torch.Tensor): time points to interpolate at with shape [num_new_times]
+
+    Returns:
+        torch.Tensor: interpolated trajectory with shape [num_new_times, ...]
+    """
+    times = times.to(values.dtype)
+    new_times = new_times.to(values.dtype).clamp(times[0], times[-1])
+    idx_next = torch.searchsorted(times, new_times).clamp(1, len(times) - 1)
+    idx_prev = idx_next - 1
+    delta = times[idx_next] - times[idx_prev]
+    weight = torch.where(delta > 0, (new_times - times[idx_prev]) / torch.where(delta > 0, delta, torch.ones_like(delta)),
+                         torch.zeros_like(delta))
+    weight = weight.reshape(-1, *([1] * (values.dim() - 1)))
+    return values[idx_prev] + weight * (values[idx_next] - values[idx_prev])
+
+class MPWeightDistribution:
+    def __init__(self, mean: torch.Tensor, cov: torch.Tensor):
+        """Gaussian distribution of movement primitive parameters.
+
+        Args:
+            mean (torch.Tensor): mean with shape [num_params]
+            cov (torch.Tensor): covariance with shape [num_params, num_params]
+        """
+        self.mean = mean
+        self.cov = cov
+
+    @classmethod
+    def from_params(cls, params: torch.Tensor, reg: float = 1e-6) -> "MPWeightDistribution":
+        """Estimates the distribution from the parameters of several fits.
+
+        Args:
+            params (torch.Tensor): parameters with shape [num_fits, num_params]
+            reg (float, optional): added to the diagonal of the covariance to keep it positive definite. Defaults to 1e-6.
+        """
+        params = params.double()
+        mean = params.mean(dim=0)
+        centered = params - mean
+        cov = centered.T @ centered / max(len(params) - 1, 1)
+        cov += reg * torch.eye(len(mean), dtype=cov.dtype)
+        return cls(mean, cov)
+
+    def sample(self, num_samples: int, generator: torch.Generator = None) -> torch.Tensor:
+        """Draws parameters from the distribution.
+
+        Returns:
+            torch.Tensor: samples with shape [num_samples, num_params]
+        """
+        normal = torch.randn(num_samples, len(self.mean), dtype=self.mean.dtype, generator=generator)
+        return self.mean + normal @ torch.linalg.cholesky(self.cov).T
+
+    def condition(self, observation_matrix: torch.Tensor, observation: torch.Tensor, noise_cov: torch.Tensor) -> "MPWeightDistribution":
+        """Conditions the distribution on a linear observation of the parameters
+        (observation = observation_matrix @ params + noise), e.g. a via point of the trajectory.
+
+        Args:
+            observation_matrix (torch.Tensor): shape [num_observations, num_params]
+            observation (torch.Tensor): shape [num_observations]
+            noise_cov (torch.Tensor): covariance of the observation noise with shape [num_observations, num_observations]
+
+        Returns:
+            MPWeightDistribution: posterior distribution
+        """
+        A = observation_matrix.to(self.cov.dtype)
+        cov_A = self.cov @ A.T
+        gain = torch.linalg.solve(A @ cov_A + noise_cov.to(self.cov.dtype), cov_A.T).T
+        mean = self.mean + gain @ (observation.to(self.mean.dtype) - A @ self.mean)
+        cov = self.cov - gain @ cov_A.T
+        return MPWeightDistribution(mean, 0.5 * (cov + cov.T))
+
+def fit_batch(times: List[torch.Tensor],
+              trajectories: List[torch.Tensor],
+              num_times: int = 500,
+              mp_config: Dict = DEFAULT_MP_CONFIG,
+              cache: MPFitCache = None) -> Dict:
+    """Fits one movement primitive per trajectory in a single batched solve.
+
+        The trajectories are resampled onto a common grid of their normalized duration (phase 0...1)
+        which is mapped onto the mean duration, so all fits share one movement primitive configuration
+        (the basis is only created once) and the weights of the different trajectories are comparable.
+
+    Args:
+        times (List[torch.Tensor]): time points of each trajectory with shape [num_times_i]
+        trajectories (List[torch.Tensor]): trajectories with shape [num_times_i, num_dof]
+        num_times (int, optional): number of points of the common grid. Defaults to 500.
+        mp_config (Dict, optional): keyword arguments of MPFactory.init_mp (tau is set to the mean duration). Defaults to DEFAULT_MP_CONFIG.
+        cache (MPFitCache, optional): cache for the fit of the batch. Defaults to None (no caching).
+
+    Returns:
+        Dict: "phase" (common grid [num_times]), "durations" ([num_trajectories]),
+              "params" (learned parameters with the batch as first dimension, see learn_mp_params_from_trajs),
+              "pos" (reproduced trajectories [num_trajectories, num_times, num_dof]),
+              "distribution" (MPWeightDistribution of the weights) and "mp_config" (configuration of the fit)
+    """
+    dtype = trajectories[0].dtype
+    phase = torch.linspace(0, 1, num_times, dtype=torch.float64)
+    durations = torch.tensor([float(t[-1] - t[0]) for t in times], dtype=torch.float64)
+    batch = torch.stack([interpolate((t - t[0]).double() / duration, trajectory, phase)
+                         for t, trajectory, duration in zip(times, trajectories, durations)])
+    tau = float(durations.mean())
+    grid = (phase * tau).to(dtype).expand(len(trajectories), num_times)
+    mp_config = {**mp_config, "tau": tau}
+    fit = cache.fit(grid, batch, mp_config) if cache is not None else fit_mp(grid, batch, mp_config)
+    return {"phase": phase,
+            "durations": durations,
+            "params": fit["params"],
+            "pos": fit["pos"],
+            "distribution": MPWeightDistribution.from_params(fit["params"]["params"]),
+            "mp_config": mp_config}
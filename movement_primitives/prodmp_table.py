@@ -0,0 +1,40 @@
+from typing import Dict
+
+import torch
+from mp_pytorch.mp import MPFactory
+
+from movement_primitives.mp_cache import DEFAULT_MP_CONFIG
+
+def tabulate_prodmp(params: Dict[str, torch.Tensor], mp_config: Dict = DEFAULT_MP_CONFIG, num_points: int = 200) -> Dict[str, torch.Tensor]:
+    """Tabulates the basis of fitted ProDMPs, so they can be evaluated without mp_pytorch (see ProDMPTorqueExecutor).
+
+        The trajectory of a ProDMP is y(t) = init(t) + basis(t)[:-1] @ weights + basis(t)[-1] * goal,
+        where init(t) is the part determined by the initial conditions.
+        basis and init are tabulated on num_points equally spaced time points in [0, tau].
+
+    Args:
+        params (Dict[str, torch.Tensor]): learned parameters with a batch dimension (see learn_mp_params_from_trajs)
+        mp_config (Dict, optional): keyword arguments of MPFactory.init_mp of the fit (including tau). Defaults to DEFAULT_MP_CONFIG.
+        num_points (int, optional): number of tabulated time points. Defaults to 200.
+
+    Returns:
+        Dict[str, torch.Tensor]: "times" ([num_points]), "basis" ([batch, num_points, num_basis + 1]),
+                                 "init" ([batch, num_points, num_dof]), "weights" ([batch, num_dof, num_basis])
+                                 and "goal" ([batch, num_dof])
+    """
+    if mp_config["mp_type"] != "prodmp":
+        raise ValueError(f"Only ProDMPs can be tabulated, got {mp_config['mp_type']}.")
+    mp = MPFactory.init_mp(**mp_config)
+    batch_size, num_dof = params["init_pos"].shape
+    times = torch.linspace(0, mp_config["tau"], num_points, dtype=params["params"].dtype)
+    mp.update_inputs(times=times.expand(batch_size, num_points), params=params["params"],
+                     init_time=params["init_time"], init_pos=params["init_pos"], init_vel=params["init_vel"])
+    mp.compute_intermediate_terms_single()
+    basis = mp.pos_H_single * mp.weights_goal_scale
+    init = mp.pos_init.reshape(batch_size, num_dof, num_points).transpose(1, 2)
+    weights_goal = params["params"].reshape(batch_size, num_dof, -1)
+    return {"times": times,
+            "basis": basis.detach(),
+            "init": init.detach(),
+            "weights": weights_goal[..., :-1].detach(),
+            "goal": weights_goal[..., -1].detach()}
@@ -1,42 +1,68 @@
-from datetime import datetime, timedelta
+from typing import Dict
 
-from mp_pytorch.mp import MPFactory
-import torchcontrol as toco
+import torch
 
-from controllers.torque_trajectory_executor import TorqueTrajectoryExecutor
+from controllers.prodmp_torque_executor import ProDMPTorqueExecutor
+from movement_primitives.mp_cache import MPFitCache
+from movement_primitives.mp_distribution import fit_batch
+from movement_primitives.prodmp_table import tabulate_prodmp
 from tasks.base_tasks import ReplayBaseTask
-from torchcontrol.utils.tensor_utils import to_tensor
 
 class MPTorqueReplay(ReplayBaseTask):
     def __init__(self, robots, demonstrations):
         super().__init__(robots, demonstrations)
-        self.demonstration = demonstrations[0]
-        self.torque_trajectory = self._create_torques_from_mp()
-        self.pos_trajectory = [tp.joint_positions for tp in self.demonstration]
-        self.pos_trajectory = [to_tensor(tp) for tp in self.pos_trajectory]
-        for robot in self.robots:
-            robot.move_to_joint_positions(self.pos_trajectory[0])
-
-    def _create_torques_from_mp(self):
-        start_time = datetime.fromtimestamp(self.demonstration[0].timestamp.seconds + self.demonstration[0].timestamp.nanos * 1e-9)
-        times = [datetime.fromtimestamp(tp.timestamp.seconds + tp.timestamp.nanos * 1e-9) for tp in self.demonstration]
-        times = [(t - start_time).total_seconds() for t in times]
-        times = toco.utils.to_tensor(times)
-        torques = [tp.joint_torques_computed for tp in self.demonstration]
-        torques = toco.utils.to_tensor(torques)
-
-        mp = MPFactory.init_mp(mp_type='prodmp', num_dof=7)
-        mp_dict = mp.learn_mp_params_from_trajs(times, torques)
-
-        torques = mp.get_trajs()['pos']
-        return torques
+        self.mp_cache = MPFitCache()
+        self.weight_distribution = None
 
-    def run(self):
-        for robot in self.robots:
-            policy = TorqueTrajectoryExecutor(self.torque_trajectory)
-            robot.send_torch_policy(policy, blocking=False)
-        self._stop_event.wait()
-        for robot in self.robots:
-            robot.send_torch_policy(None, blocking=True)
+    def _fit_mps(self) -> Dict[str, torch.Tensor]:
+        """Fits the torques of all demonstrations in one batch.
+
+            Multi-robot recordings are split into one demonstration per recorded robot.
 
+        Returns:
+            Dict[str, torch.Tensor]: tabulated MP of each demonstration (see tabulate_prodmp),
+                                     the "time_scale" that stretches the MP to the duration of the demonstration
+                                     and the "batch_idx" of the demonstration replayed by each robot (see demonstration_for)
+        """
+        demonstrations = []
+        offsets = []
+        for demonstration in self.demonstrations:
+            offsets.append(len(demonstrations))
+            demonstrations += [demonstration.robot(robot) for robot in demonstration.robots] or [demonstration]
+        times = [demonstration.field_time("joint_torques_computed") for demonstration in demonstrations]
+        torques = [demonstration.joint_torques_computed for demonstration in demonstrations]
 
+        # the fit is loaded from the cache if the same demonstrations were fitted before
+        fit = fit_batch(times, torques, cache=self.mp_cache)
+        self.weight_distribution = fit["distribution"]
+        table = tabulate_prodmp(fit["params"], fit["mp_config"])
+        table["time_scale"] = fit["mp_config"]["tau"] / fit["durations"]
+        batch_idx = []
+        for idx in range(len(self.robots)):
+            demonstration = self.demonstrations[idx % len(self.demonstrations)]
+            num_robots = max(len(demonstration.robots), 1)
+            batch_idx.append(offsets[idx % len(self.demonstrations)] + idx % num_robots)
+        table["batch_idx"] = torch.tensor(batch_idx)
+        return table
+
+    def run(self):
+        table = self._fit_mps()
+        start_positions = []
+        policies = []
+        for idx, robot in enumerate(self.robots):
+            demonstration = self.demonstration_for(idx)
+            b = int(table["batch_idx"][idx])
+            start_positions.append(demonstration.joint_positions[0])
+            # the policy only contains the MP, the torques are evaluated on the robot
+            policies.append(ProDMPTorqueExecutor(table["times"],
+                                                 table["basis"][b],
+                                                 table["init"][b],
+                                                 table["weights"][b],
+                                                 table["goal"][b],
+                                                 time_scale=float(table["time_scale"][b]),
+                                                 hz=robot.metadata.hz,
+                                                 armed=True,
+                                                 joint_pos_hold=start_positions[-1],
+                                                 Kq=robot.Kq_default,
+                                                 Kqd=robot.Kqd_default))
+        self._replay(start_positions, policies)
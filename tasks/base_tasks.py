@@ -1,10 +1,208 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+import io
 import threading
 import logging
-import torch
+import math
+import time
 
+import grpc
+import torch
+import torchcontrol as toco
 from polymetis import RobotInterface
+from polymetis_pb2 import ControllerChunk, Empty, RobotState
+
+from data_management.demonstration import Demonstration
+from utils.latency_histogram import LatencyHistogram
+
+class LoopScheduler:
+    def __init__(self, frequency: float, logger: logging.Logger = None, overrun_report_period: float = 1.0):
+        """Runs a step function at a fixed frequency.
+
+            Steps are started at absolute deadlines (start + k / frequency, measured with time.perf_counter),
+            the time until the next deadline is slept instead of spinning.
+            If a step takes longer than a period, the missed deadlines are skipped (counted as overruns)
+            so the loop does not try to catch up with a burst of steps.
+            The step latency (duration of a step) and the jitter (delay of the step start after its deadline)
+            are recorded in histograms.
+
+        Args:
+            frequency (float): loop frequency in Hz
+            logger (logging.Logger, optional): logger for overrun warnings and the final report. Defaults to None.
+            overrun_report_period (float, optional): minimum time in s between two overrun warnings. Defaults to 1.0.
+        """
+        self.frequency = frequency
+        self.period = 1 / frequency
+        self.logger = logger or logging.getLogger(__name__)
+        self.overrun_report_period = overrun_report_period
+        self.latency = LatencyHistogram()
+        self.jitter = LatencyHistogram(min_us=1.0)
+        self.iterations = 0
+        self.overruns = 0
+
+    def run(self, step: Callable[[], None], stop_event: threading.Event):
+        """Calls step at the configured frequency until stop_event is set.
+
+        Args:
+            step (Callable[[], None]): function executed once per period
+            stop_event (threading.Event): event ending the loop
+        """
+        start_time = time.perf_counter()
+        deadline = start_time
+        last_report_time = start_time
+        reported_overruns = self.overruns
+        while not stop_event.is_set():
+            step_start = time.perf_counter()
+            step()
+            step_end = time.perf_counter()
+            self.iterations += 1
+            self.jitter.add((step_start - deadline) * 1e6)
+            self.latency.add((step_end - step_start) * 1e6)
+
+            deadline += self.period
+            if step_end > deadline:
+                # skip the missed deadlines and continue with the next one in the future
+                missed = math.ceil((step_end - deadline) / self.period)
+                self.overruns += missed
+                deadline += missed * self.period
+            if self.overruns > reported_overruns and step_end - last_report_time >= self.overrun_report_period:
+                self.logger.warning(f"{self.overruns - reported_overruns} overruns at {self.frequency:.0f} Hz "
+                                    f"(step latency p99 {self.latency.percentile(99) / 1000:.2f} ms).")
+                reported_overruns = self.overruns
+                last_report_time = step_end
+            stop_event.wait(max(deadline - time.perf_counter(), 0.0))
+        self.logger.info(self.report())
+
+    def statistics(self) -> Dict:
+        return {"frequency": self.frequency,
+                "iterations": self.iterations,
+                "overruns": self.overruns,
+                "latency": self.latency.summary(),
+                "jitter": self.jitter.summary()}
+
+    def report(self) -> str:
+        latency = self.latency.summary()
+        jitter = self.jitter.summary()
+        return (f"{self.iterations} iterations at {self.frequency:.0f} Hz, {self.overruns} overruns. "
+                f"Latency p50/p99/max: {latency['p50_us'] / 1000:.2f}/{latency['p99_us'] / 1000:.2f}/{latency['max_us'] / 1000:.2f} ms, "
+                f"jitter p50/p99/max: {jitter['p50_us'] / 1000:.2f}/{jitter['p99_us'] / 1000:.2f}/{jitter['max_us'] / 1000:.2f} ms.")
+
+class RobotWorkerPool:
+    def __init__(self, robots: List[RobotInterface]):
+        """One persistent worker thread per robot to send (blocking) requests to several robots concurrently.
+
+            Requests to the same robot are executed in submission order by its worker,
+            requests to different robots run in parallel (gRPC releases the GIL while waiting),
+            so the latency of a fan-out does not grow with the number of robots.
+
+        Args:
+            robots (List[RobotInterface]): robots the requests are sent to
+        """
+        self.robots = robots
+        self._executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"robot_worker_{idx}")
+                           for idx in range(len(robots))]
+
+    def submit(self, idx: int, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Executes fn(robots[idx], *args, **kwargs) in the worker of the robot.
+
+        Returns:
+            Future: result of the call
+        """
+        return self._executors[idx].submit(fn, self.robots[idx], *args, **kwargs)
+
+    def map(self, fn: Callable[..., Any], *args, **kwargs) -> List[Any]:
+        """Executes fn(robot, *args, **kwargs) for all robots concurrently and waits for all of them.
+        Exceptions are raised after all calls finished.
+
+        Returns:
+            List[Any]: results in the order of the robots
+        """
+        return self.map_each(fn, *([arg] * len(self.robots) for arg in args), **kwargs)
+
+    def map_each(self, fn: Callable[..., Any], *args: Sequence[Any], **kwargs) -> List[Any]:
+        """Executes fn(robots[i], args[0][i], args[1][i], ..., **kwargs) for all robots concurrently and waits for all of them.
+        Exceptions are raised after all calls finished.
+
+        Returns:
+            List[Any]: results in the order of the robots
+        """
+        robot_args = list(zip(*args)) if len(args) > 0 else [()] * len(self.robots)
+        futures = [self.submit(idx, fn, *arguments, **kwargs) for idx, arguments in enumerate(robot_args)]
+        for future in futures:
+            future.exception()
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+class RobotStateSubscriber(threading.Thread):
+    def __init__(self, robot: RobotInterface):
+        """Subscribes to the robot state stream of a robot and keeps the latest state.
+
+            Reading the latest state does not need a request to the robot server,
+            so tasks only have to send their commands.
+
+        Args:
+            robot (RobotInterface): robot whose states are received
+        """
+        super().__init__(daemon=True)
+        self.robot = robot
+        self.logger = logging.getLogger(__name__)
+        self._stream = robot.grpc_connection.GetRobotStateStream(Empty())
+        self._latest_state: RobotState = None
+        self._state_received_event = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            for robot_state in self._stream:
+                # replacing the reference is atomic, readers always get a complete state
+                self._latest_state = robot_state
+                self._state_received_event.set()
+        except grpc.RpcError as e:
+            if not self._stop_event.is_set():
+                self.logger.error(f"Robot state stream failed: {e}")
+
+    @property
+    def latest_state(self) -> RobotState:
+        """most recently received robot state (None before the first state)"""
+        return self._latest_state
+
+    def wait_for_state(self, timeout: float = None) -> RobotState:
+        """Waits until the first robot state is received.
+
+        Args:
+            timeout (float, optional): maximum waiting time in s. Defaults to None (no limit).
+
+        Raises:
+            TimeoutError: no state was received within the timeout
+
+        Returns:
+            RobotState: latest robot state
+        """
+        if not self._state_received_event.wait(timeout):
+            raise TimeoutError("No robot state received.")
+        return self._latest_state
+
+    def stop(self):
+        self._stop_event.set()
+        self._stream.cancel()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        self.join()
 
 class BaseTask(threading.Thread, ABC):
     def __init__(self, robots: List[RobotInterface]) -> None:
@@ -50,6 +248,100 @@ class TeleoperationBaseTask(BaseTask, ABC):
         self.logger.info(f"Robot positions synced successfully.")
 
 class ReplayBaseTask(BaseTask, ABC):
-    def __init__(self, robots: List[RobotInterface], demonstrations: List[Dict[str, torch.Tensor]]) -> None:
+    def __init__(self, robots: List[RobotInterface], demonstrations: List[Demonstration]) -> None:
+        """Base class for tasks replaying recorded demonstrations
+
+        Args:
+            robots (List[RobotInterface]): robots that can be controlled by the task
+            demonstrations (List[Demonstration]): lazy handles of the selected demonstrations
+        """
         super().__init__(robots)
         self.demonstrations = demonstrations
+
+    def demonstration_for(self, robot_idx: int) -> Demonstration:
+        """Returns the demonstration replayed by a robot, the demonstrations are assigned to the robots in turn.
+        Of a time-aligned multi-robot recording (see MultiRobotDataManager) the robots are assigned in turn as well.
+        """
+        demonstration = self.demonstrations[robot_idx % len(self.demonstrations)]
+        recorded_robots = demonstration.robots
+        if len(recorded_robots) > 0:
+            # the fields are prefixed with the name of the recorded robot
+            return demonstration.robot(recorded_robots[robot_idx % len(recorded_robots)])
+        return demonstration
+
+    @staticmethod
+    def _update_message(update: Dict[str, torch.Tensor]) -> ControllerChunk:
+        # serialized ahead of time, so time critical updates only have to be sent
+        updater = torch.jit.script(toco.policies.ParamDictContainer(update))
+        buffer = io.BytesIO()
+        torch.jit.save(updater, buffer)
+        return ControllerChunk(torchscript_binary_chunk=buffer.getvalue())
+
+    @staticmethod
+    def _start_message() -> ControllerChunk:
+        return ReplayBaseTask._update_message({"started": torch.ones(1)})
+
+    @staticmethod
+    def _start_policy(robot: RobotInterface, start_message: ControllerChunk, start_time: float):
+        time.sleep(max(start_time - time.time(), 0.0))
+        robot.grpc_connection.UpdateController(iter([start_message]))
+
+    def _stream_updates(self, robot: RobotInterface, updates: Iterator[Tuple[float, Dict[str, torch.Tensor]]], start_time: float):
+        """Sends each update once its time after the start is reached, until all are sent or the task is stopped.
+
+            If an update is sent late, the policy may have paused while waiting for it,
+            so all following updates are delayed by the same amount.
+        """
+        delay = 0.0
+        for update_time, update in updates:
+            message = self._update_message(update)
+            send_time = start_time + update_time + delay
+            if self._stop_event.wait(max(send_time - time.time(), 0.0)):
+                return
+            try:
+                robot.grpc_connection.UpdateController(iter([message]))
+            except grpc.RpcError as e:
+                self.logger.error(f"Streaming the policy updates failed: {e.details()}")
+                return
+            lateness = time.time() - send_time
+            if lateness > 0.01:
+                self.logger.warning(f"Policy update sent {lateness * 1000:.0f} ms late, delaying the following updates.")
+                delay += lateness
+
+    def _terminate_policy(self, robot: RobotInterface):
+        try:
+            robot.terminate_current_policy()
+        except grpc.RpcError:
+            self.logger.debug("Policy already terminated.")
+
+    def _replay(self,
+                start_positions: List[torch.Tensor],
+                policies: List[toco.PolicyModule],
+                start_delay: float = 0.2,
+                updates: List[Iterator[Tuple[float, Dict[str, torch.Tensor]]]] = None):
+        """Moves the robots to their start positions, starts the policies on all robots at the same time
+        and terminates them after "Stop".
+
+            All requests are sent by one worker per robot in parallel, so the setup time does not grow
+            with the number of robots. The policies have to wait for update_current_policy({"started": torch.ones(1)})
+            (see TorqueTrajectoryExecutor), which is sent to all robots at a shared start time.
+
+        Args:
+            start_positions (List[torch.Tensor]): joint positions to move each robot to
+            policies (List[toco.PolicyModule]): armed policy of each robot
+            start_delay (float, optional): time in s between the upload of the policies and the start. Defaults to 0.2.
+            updates (List[Iterator[Tuple[float, Dict[str, torch.Tensor]]]], optional): parameter updates of each robot
+                sent during the replay with their time after the start (see chunk_updates). Defaults to None.
+        """
+        with RobotWorkerPool(self.robots) as workers:
+            self.logger.info("Moving robots to their start positions...")
+            workers.map_each(RobotInterface.move_to_joint_positions, start_positions)
+            workers.map_each(RobotInterface.send_torch_policy, policies, blocking=False)
+            start_time = time.time() + start_delay
+            workers.map(self._start_policy, self._start_message(), start_time)
+            self.logger.info(f"Replay started on {len(self.robots)} robots.")
+            # the workers stream the updates, the termination is queued behind them
+            for idx, robot_updates in enumerate(updates or []):
+                workers.submit(idx, self._stream_updates, robot_updates, start_time)
+            self._stop_event.wait()
+            workers.map(self._terminate_policy)
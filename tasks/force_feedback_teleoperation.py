@@ -1,6 +1,6 @@
 from typing import List
 from polymetis import RobotInterface
-from tasks.base_tasks import TeleoperationBaseTask
+from tasks.base_tasks import LoopScheduler, RobotStateSubscriber, RobotWorkerPool, TeleoperationBaseTask
 
 from torchcontrol.policies import HybridJointImpedanceControl
 from torchcontrol.utils import tensor_utils
@@ -9,13 +9,19 @@ from polymetis import RobotInterface
 from controllers.force_feedback_controller import ForceFeedbackController
 
 class ForceFeedbackTeleoperationTask(TeleoperationBaseTask):
-    def __init__(self, robots: List[RobotInterface]) -> None:
+    def __init__(self, robots: List[RobotInterface], control_freq: float = 500.0, feedback_mode: str = "clamp") -> None:
         """Task for teleoperating one or more robots
 
+            The states of both robots are received via their robot state streams,
+            so each step only sends the new setpoint to the replicant and the force feedback to the demonstrator
+            (concurrently).
+
         Args:
             robots (List[RobotInterface]):  First robot will be used as demonstrator.
                                             Second robot will replicat the movements and return force feedback to the demonstrator.
                                             All others will not do anything.
+            control_freq (float, optional): Frequency in Hz in which setpoint and force feedback are updated. Defaults to 500.0.
+            feedback_mode (str, optional): blending of the force feedback (see ForceFeedbackController). Defaults to "clamp".
         """
         super().__init__(robots)
         if len(self.robots) < 2:
@@ -25,12 +31,19 @@ class ForceFeedbackTeleoperationTask(TeleoperationBaseTask):
         self.replicant = self.robots[1]
         if len(self.robots) > 2:
             self.logger.info("More than two robots supplied. Only the first two robots are used by this task.")
+        self.scheduler = LoopScheduler(control_freq, self.logger)
+        self.feedback_mode = feedback_mode
+        self.demonstrator_states: RobotStateSubscriber = None
+        self.replicant_states: RobotStateSubscriber = None
+        self.workers: RobotWorkerPool = None
 
     def _initialize_policies(self):
         self.logger.info("Initializing policies...")
-        initial_replication_torques = tensor_utils.to_tensor(self.replicant.get_robot_state().motor_torques_external)
+        ### ATTENTION: motor_torques_external are exactly opposite to the expectation
+        initial_replication_torques = - tensor_utils.to_tensor(self.replicant_states.wait_for_state(timeout=5.0).motor_torques_external)
         demonstrator_policy = ForceFeedbackController(self.demonstrator.robot_model,
-                                                      initial_replication_torques)
+                                                      initial_replication_torques=initial_replication_torques,
+                                                      feedback_mode=self.feedback_mode)
         replicant_policy = HybridJointImpedanceControl(joint_pos_current=self.replicant.get_joint_positions(),
                                                         Kq=self.replicant.Kq_default, 
                                                         Kqd=self.replicant.Kqd_default, 
@@ -42,15 +55,29 @@ class ForceFeedbackTeleoperationTask(TeleoperationBaseTask):
         self.replicant.send_torch_policy(replicant_policy, blocking=False)
         self.logger.info("Policies initilized.")
 
+    def _update_setpoint(self, replicant: RobotInterface, joint_pos_demonstrator):
+        replicant.update_desired_joint_positions(joint_pos_demonstrator)
+
+    def _update_feedback(self, demonstrator: RobotInterface, current_replication_torques):
+        demonstrator.update_current_policy({"replication_torques" : current_replication_torques})
+
+    def _step(self):
+        joint_pos_demonstrator = tensor_utils.to_tensor(self.demonstrator_states.latest_state.joint_positions)
+        ### ATTENTION: motor_torques_external are exactly opposite to the expectation
+        current_replication_torques = self.replicant_states.latest_state.motor_torques_external
+        current_replication_torques = - tensor_utils.to_tensor(current_replication_torques)#correct torque direction
+        setpoint = self.workers.submit(1, self._update_setpoint, joint_pos_demonstrator)
+        feedback = self.workers.submit(0, self._update_feedback, current_replication_torques)
+        setpoint.result()
+        feedback.result()
+
     def run(self):
         self.sync_robot_positions()
-        self._initialize_policies()
-        self.logger.info("Starting force feedback teleoperation...")
-        while not self._stop_event.is_set():
-            joint_pos_demonstrator = self.demonstrator.get_joint_positions()
-            self.replicant.update_desired_joint_positions(joint_pos_demonstrator)
-            ### ATTENTION: motor_torques_external are exactly opposite to the expectation
-            current_replication_torques = self.replicant.get_robot_state().motor_torques_external 
-            current_replication_torques = - tensor_utils.to_tensor(current_replication_torques)#correct torque direction
-            self.demonstrator.update_current_policy({"replication_torques" : current_replication_torques})
-        self.logger.info("Teleoperation terminated successfully.")
\ No newline at end of file
+        with RobotStateSubscriber(self.demonstrator) as self.demonstrator_states, \
+             RobotStateSubscriber(self.replicant) as self.replicant_states, \
+             RobotWorkerPool([self.demonstrator, self.replicant]) as self.workers:
+            self._initialize_policies()
+            self.demonstrator_states.wait_for_state(timeout=5.0)
+            self.logger.info("Starting force feedback teleoperation...")
+            self.scheduler.run(self._step, self._stop_event)
+        self.logger.info("Teleoperation terminated successfully.")
@@ -4,19 +4,22 @@ from polymetis import RobotInterface
 from torchcontrol.policies import HybridJointImpedanceControl
 
 from controllers.human_controller import HumanController
-from tasks.base_tasks import TeleoperationBaseTask
+from tasks.base_tasks import LoopScheduler, RobotWorkerPool, TeleoperationBaseTask
 
 class MultibotTeleoperationTask(TeleoperationBaseTask):
-    def __init__(self, robots: List[RobotInterface]) -> None:
+    def __init__(self, robots: List[RobotInterface], control_freq: float = 200.0) -> None:
         """Task for teleoperating one or more robots
 
         Args:
             robots (List[RobotInterface]):  First robot will be used as demonstrator.
                                             All others will replicate the movements.
+            control_freq (float, optional): Frequency in Hz in which the replicants are updated. Defaults to 200.0.
         """
         super().__init__(robots)
         self.demonstrator = self.robots[0]
         self.replicants = self.robots[1:]
+        self.scheduler = LoopScheduler(control_freq, self.logger)
+        self.replicant_workers: RobotWorkerPool = None
 
     def _initialize_policies(self):
         self.logger.info("Initializing policies...")
@@ -33,12 +36,15 @@ class MultibotTeleoperationTask(TeleoperationBaseTask):
             replicant.send_torch_policy(replicant_policy, blocking=False)
         self.logger.info("Policies initilized.")
 
+    def _step(self):
+        joint_pos_demonstrator = self.demonstrator.get_joint_positions()
+        # the setpoint is sent to all replicants at once, so the step latency does not grow with their number
+        self.replicant_workers.map(RobotInterface.update_desired_joint_positions, joint_pos_demonstrator)
+
     def run(self):
         self.sync_robot_positions()
         self._initialize_policies()
         self.logger.info("Starting multibot teleoperation...")
-        while not self._stop_event.is_set():
-            joint_pos_demonstrator = self.demonstrator.get_joint_positions()
-            for replicant in self.replicants:
-                replicant.update_desired_joint_positions(joint_pos_demonstrator)
+        with RobotWorkerPool(self.replicants) as self.replicant_workers:
+            self.scheduler.run(self._step, self._stop_event)
         self.logger.info("Multibot teleoperation terminated successfully.")
\ No newline at end of file
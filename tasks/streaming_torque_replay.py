@@ -0,0 +1,37 @@
+from controllers.streaming_torque_trajectory_executor import StreamingTorqueTrajectoryExecutor, chunk_updates
+from tasks.base_tasks import ReplayBaseTask
+
+class StreamingTorqueDemonstrationReplay(ReplayBaseTask):
+    def __init__(self, robots, demonstrations, chunk_size: int = 1000):
+        """Replays the recorded torques like TorqueDemonstrationReplay, but streams them to the robots in chunks,
+        so the upload time of the policy does not depend on the length of the demonstrations.
+
+        Args:
+            robots (List[RobotInterface]): robots replaying the demonstrations
+            demonstrations (List[Demonstration]): lazy handles of the selected demonstrations
+            chunk_size (int, optional): number of torques per buffer of the executor. Defaults to 1000.
+        """
+        super().__init__(robots, demonstrations)
+        self.chunk_size = chunk_size
+
+    def run(self):
+        start_positions = []
+        policies = []
+        updates = []
+        for idx, robot in enumerate(self.robots):
+            demonstration = self.demonstration_for(idx)
+            torques = demonstration.joint_torques_computed
+            times = demonstration.field_time("joint_torques_computed")
+            # the executor expects equally spaced torques
+            knot_dt = float(times[-1] - times[0]) / max(len(times) - 1, 1) if len(times) > 1 else None
+            start_positions.append(demonstration.joint_positions[0])
+            policies.append(StreamingTorqueTrajectoryExecutor(torques,
+                                                              chunk_size=self.chunk_size,
+                                                              knot_dt=knot_dt,
+                                                              hz=robot.metadata.hz,
+                                                              armed=True,
+                                                              joint_pos_hold=start_positions[-1],
+                                                              Kq=robot.Kq_default,
+                                                              Kqd=robot.Kqd_default))
+            updates.append(chunk_updates(torques, self.chunk_size, policies[-1].knot_dt))
+        self._replay(start_positions, policies, updates=updates)
@@ -0,0 +1,47 @@
+from bisect import bisect_right
+import math
+from typing import Dict
+
+class LatencyHistogram:
+    def __init__(self, min_us: float = 10.0, max_us: float = 1_000_000.0, bins_per_decade: int = 20):
+        """Histogram with logarithmic bins for durations, adding a value is O(log(bins)) and does not allocate.
+
+        Args:
+            min_us (float, optional): upper edge of the first bin in µs. Defaults to 10.0.
+            max_us (float, optional): lower edge of the last bin in µs. Defaults to 1_000_000.0 (1 s).
+            bins_per_decade (int, optional): resolution of the histogram. Defaults to 20.
+        """
+        num_edges = int(round(math.log10(max_us / min_us) * bins_per_decade)) + 1
+        self.edges_us = [min_us * (max_us / min_us) ** (i / (num_edges - 1)) for i in range(num_edges)]
+        self.counts = [0] * (num_edges + 1)
+        self.num_values = 0
+        self.sum_us = 0.0
+        self.max_us = 0.0
+
+    def add(self, value_us: float):
+        self.counts[bisect_right(self.edges_us, value_us)] += 1
+        self.num_values += 1
+        self.sum_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    @property
+    def mean_us(self) -> float:
+        return self.sum_us / self.num_values if self.num_values > 0 else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Returns the upper bin edge below which q percent of the values are (the maximum for the last bin)."""
+        if self.num_values == 0:
+            return 0.0
+        threshold = q / 100 * self.num_values
+        cumulative = 0
+        for idx, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold and count > 0:
+                return min(self.edges_us[idx], self.max_us) if idx < len(self.edges_us) else self.max_us
+        return self.max_us
+
+    def summary(self) -> Dict[str, float]:
+        return {"mean_us": self.mean_us,
+                "p50_us": self.percentile(50),
+                "p99_us": self.percentile(99),
+                "max_us": self.max_us}